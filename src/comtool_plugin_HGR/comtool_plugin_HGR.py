@@ -1,8 +1,6 @@
-import atexit
 import os
-import shutil
-import tempfile
-from dataclasses import dataclass
+import threading
+from collections import deque
 from time import perf_counter_ns
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QTextEdit, QPushButton, QLineEdit, QGridLayout,
@@ -18,6 +16,14 @@ from COMTool.plugins.base import Plugin_Base
 from COMTool.conn import ConnectionStatus
 from data_processor import FloatFrameParser
 from notification import NotificationContainer
+from record_format import DatabaseInfo, InitInfo
+from rate_estimator import parse_sampling_frequency
+from recorder_core import RecordingFile, SampleAssembler, SampleBlock
+from stream_server import AcquisitionServer
+from inference import InferenceStage, TemplateClassifier, latency_summary
+from template_index import TemplateIndex
+from data_loader import load_recording
+import profiler
 
 def open_directory_dialog()-> str:
     return QFileDialog.getExistingDirectory(None,"选择目录","")
@@ -28,33 +34,6 @@ class EmittingStream(QObject):
     def write(self, text):
         self.textWritten.emit(str(text))
 
-@dataclass
-class DatabaseInfo:
-    data_set_name: str
-    collection_date: str
-    participant_id: str
-    gesture_type: str
-    collection_count: int
-    sensor_type: str
-    sampling_frequency: str
-    encode_format: str
-    annotation: str
-    data_format: str
-
-InitInfo = DatabaseInfo(
-    data_set_name="手势识别项目 v1.0",
-    collection_date="0000-00-00",
-    participant_id="P000",
-    gesture_type="<UNK>",
-    collection_count=0,
-    sensor_type="BNO08x",
-    sampling_frequency="50Hz",
-    encode_format="utf-8",
-    annotation=f"{'#'*20}",
-    data_format="timestamp,acc_x,acc_y,acc_z,gyro_x,gyro_y,gyro_z"
-)
-
-
 # 新增状态指示器组件
 class StatusIndicator(QWidget):
     def __init__(self, parent=None):
@@ -89,16 +68,43 @@ class Plugin(Plugin_Base):
     id = "Seri_recor"
     name = ("Serial port recorder")
     updateSignal = pyqtSignal(str, object)
-    writeSignal = pyqtSignal(tuple)
+    writeSignal = pyqtSignal(object, object)  # SampleBlock (帧块), 发射时间 ns (未开启计时为 0)
     flay_file_writer_paraChangedSignal = pyqtSignal(bool)
     flay_file_writer = False
+    # 录制时按文件头声明的采样频率重采样到均匀时间网格
+    resample_to_declared_rate = False
+    # 设置后启动多路采集服务, 把接收到的原始数据转发给本地客户端 (见 stream_server.py)
+    stream_socket_path = None
+    # 记录各处理阶段耗时, 每次录制结束后导出 Chrome trace 文件到临时文件目录 (见 profiler.py)
+    profile_capture = os.environ.get("HGR_PROFILE", "").strip().lower() not in ("", "0", "false", "no", "off")
 
     def __init__(self):
         super().__init__()
         self.path_to_file = None
         self.data_processor = FloatFrameParser()
+        # 由 UI 线程置位, 接收线程在下一次解析前重置解析器
+        # (解析进行中缓冲区有 numpy 视图, 不能从其他线程清空)
+        self._parser_reset_pending = False
         self.file_info = None
         self.flay_file_writer_paraChangedSignal.connect(self._write_status_changed)
+        self.stream_server = None
+        if self.stream_socket_path:
+            self.stream_server = AcquisitionServer(self.stream_socket_path)
+            try:
+                self.stream_server.start_in_thread()
+            except Exception as e:
+                # 路径无效、没有权限, 或 Windows 上没有 Unix domain socket
+                print(f"多路采集服务启动失败: {e}")
+                self.stream_server = None
+        self.inference_stage = None
+        self.inference_latencies = deque(maxlen=100)
+        # 保存后做重复采集检查用的索引, 首次保存时在后台线程中从保存目录中
+        # 已有的录制构建 (与在线识别的模板索引相互独立)
+        self.repetition_index = None
+        self.repetition_dir = None
+        self._repetition_pending = []  # 索引构建期间保存的文件
+        if self.profile_capture:
+            profiler.enable()
 
     def onConnChanged(self, status:ConnectionStatus, msg:str):
         super().onConnChanged(status, msg)
@@ -132,6 +138,9 @@ class Plugin(Plugin_Base):
         self.status_label = QLabel("记录状态:")
         self.status_label.setAlignment(Qt.AlignCenter)
 
+        # 在线识别结果
+        self.inference_label = QLabel("识别: -")
+
         # 创建定时器
         self.timer = QTimer(self)
         self.timer.timeout.connect(self._update_progress)
@@ -157,6 +166,7 @@ class Plugin(Plugin_Base):
         layout2.addWidget(self.progressBar)
         layout2.addWidget(self.status_label)
         layout2.addWidget(self.status_indicator)
+        layout2.addWidget(self.inference_label)
         layout2.addLayout(grid_layout_buttons)
 
         widget1.setLayout(layout1)
@@ -209,17 +219,75 @@ class Plugin(Plugin_Base):
             # 将数据转换为十六进制字符串
             hex_data = ' '.join([f'{b:02X}' for b in data])
             self.receiveArea.insertPlainText(hex_data + "\n")
+        elif data_type == "inference":
+            # 端到端延迟: 样本到达 -> 结果显示
+            self.inference_latencies.append((perf_counter_ns() - data.arrival_ns) / 1e6)
+            self.inference_label.setText(
+                f"识别: {data.label} ({data.score:.2f})  "
+                f"延迟 {latency_summary(list(self.inference_latencies))}"
+            )
+        elif data_type == "templates":
+            self._install_templates(data)
+        elif data_type == "repetition_index":
+            self._install_repetition_index(*data)
     
     def onReceived(self, data : bytes):
         '''
             call in receive thread, not UI thread
         '''
+        arrival_ns = perf_counter_ns()
+        prof = profiler.ACTIVE
         super().onReceived(data)
         self.updateSignal.emit("receive", data)
-        if self.flay_file_writer:
-            data_set = self.data_processor.parse_frame(data)
-            if data_set is not None :
-                self.writeSignal.emit(data_set)
+        stream_server = self.stream_server
+        inference_stage = self.inference_stage
+        # 只解析一次, 帧块同时交给录制、在线识别和多路采集服务
+        if self.flay_file_writer or inference_stage is not None or stream_server is not None:
+            if self._parser_reset_pending:
+                self._parser_reset_pending = False
+                self.data_processor.reset()
+            frames = self.data_processor.parse_block(data, arrival_ns)
+            if len(frames):
+                if self.flay_file_writer:
+                    self.writeSignal.emit(frames, perf_counter_ns() if prof is not None else 0)
+                if inference_stage is not None:
+                    inference_stage.push_block(frames)
+                if stream_server is not None:
+                    stream_server.feed_block_threadsafe(frames)
+        if prof is not None:
+            prof.record(profiler.ON_RECEIVED, arrival_ns, perf_counter_ns())
+
+    def on_button_load_templates_handle(self):
+        """选择已保存录制文件所在目录, 构建模板并开始在线识别"""
+        directory = open_directory_dialog()
+        if not directory:
+            return
+        # 模板较多时读取和建索引耗时较长, 在后台线程中进行, 完成后通过 updateSignal 回到 UI 线程
+        self.btn_templates.setEnabled(False)
+        self.notification_container.add_notification("正在加载模板...")
+        threading.Thread(target=self._load_templates, args=(directory,),
+                         name="hgr-load-templates", daemon=True).start()
+
+    def _load_templates(self, directory: str):
+        """后台线程: 读取模板 (不启动进程池) 并构建识别模型"""
+        try:
+            model = TemplateClassifier(TemplateIndex.from_directory(directory, workers=1))
+        except (OSError, ValueError) as e:
+            model = e
+        self.updateSignal.emit("templates", model)
+
+    def _install_templates(self, model):
+        """UI 线程: 用加载完成的模型替换在线识别阶段"""
+        self.btn_templates.setEnabled(True)
+        if isinstance(model, Exception):
+            QMessageBox.warning(self.widget, "警告", f"无法加载模板: {model}")
+            return
+        if self.inference_stage is not None:
+            self.inference_stage.close()
+        self.inference_latencies.clear()
+        self.inference_stage = InferenceStage(
+            model, lambda result: self.updateSignal.emit("inference", result))
+        self.notification_container.add_notification(f"已加载 {len(model.labels)} 个模板")
 
     def on_button_tmp_file_open_clicked_handle(self):
         # open in explorer
@@ -248,13 +316,94 @@ class Plugin(Plugin_Base):
             if self.fileWriter.save_as_file(file_path, self.file_info):  # 使用 self.fileWriter 实例
                 QMessageBox.information(self.widget, "成功", f"文件已保存到:\n{file_path}")
                 print(f"文件已保存到:{file_path}")
+                self._check_sampling_rate()
+                self._check_repetition(file_path)
                 self.fileWriter.re_init()
                 self.parameter_widget.increment_collection_count()
             else:
                 QMessageBox.critical(self.widget, "错误", "文件保存失败！")
 
+    def _check_sampling_rate(self):
+        """检查实际采样率是否与文件头声明的一致"""
+        report = self.fileWriter.check_rate(self.file_info)
+        if report is None:
+            return
+        print(report.describe())
+        if not report.ok:
+            self.notification_container.add_notification(report.describe())
+
+    def _check_repetition(self, file_path: str):
+        """
+        与保存目录中同一手势 / 参与者之前的录制比较, 并把本次录制加入索引
+
+        索引在后台线程中从保存目录构建, 构建完成前跳过检查;
+        期间保存的文件在构建完成后补充到索引中。
+        """
+        directory = os.path.dirname(os.path.abspath(file_path))
+        if self.repetition_dir != directory:
+            self.repetition_dir = directory
+            self.repetition_index = None
+            self._repetition_pending = []
+            threading.Thread(target=self._load_repetition_index, args=(directory,),
+                             name="hgr-load-repetitions", daemon=True).start()
+            self.notification_container.add_notification("正在载入已有录制, 本次跳过重复采集检查")
+            return
+        if self.repetition_index is None:
+            self._repetition_pending.append(file_path)
+            return
+        self._check_and_add_repetition(file_path)
+
+    def _load_repetition_index(self, directory: str):
+        """后台线程: 读取保存目录中已有的录制 (不启动进程池)"""
+        try:
+            index = TemplateIndex.from_directory(directory, workers=1)
+        except (OSError, ValueError) as e:
+            print(f"载入已有录制失败: {e}")
+            index = None
+        self.updateSignal.emit("repetition_index", (directory, index))
+
+    def _install_repetition_index(self, directory: str, index):
+        """UI 线程: 索引构建完成"""
+        if directory != self.repetition_dir:
+            return  # 构建期间已换了保存目录
+        if index is None:
+            self.repetition_dir = None  # 下次保存时重试
+            return
+        self.repetition_index = index
+        print(f"已从 {directory} 载入 {len(index)} 条录制")
+        loaded = {os.path.normcase(os.path.normpath(os.path.join(directory, key))) for key in index.keys}
+        pending, self._repetition_pending = self._repetition_pending, []
+        for file_path in pending:
+            if os.path.normcase(os.path.abspath(file_path)) not in loaded:
+                self._check_and_add_repetition(file_path)
+
+    def _check_and_add_repetition(self, file_path: str):
+        try:
+            recording = load_recording(file_path)
+        except (OSError, ValueError) as e:
+            print(f"读取录制文件失败: {e}")
+            return
+        if len(recording.values) <= 1:
+            return
+        report = self.repetition_index.check_and_add(recording.values, recording.info, file_path)
+        print(report.describe())
+        if report.outlier:
+            self.notification_container.add_notification(report.describe())
+
     def on_button_start_clicked_handle(self):
         self.update_steps = 0
+        # 丢弃上一次录制遗留的不完整帧, 不与新到达的数据拼接 (在接收线程中执行)
+        self._parser_reset_pending = True
+        # 计时记录只覆盖本次录制
+        if profiler.ACTIVE is not None:
+            profiler.ACTIVE.clear()
+        resample_hz = None
+        if self.resample_to_declared_rate:
+            try:
+                resample_hz = parse_sampling_frequency((self.file_info or InitInfo).sampling_frequency)
+            except ValueError as e:
+                print(f"不进行重采样: {e}")
+        self.fileWriter.set_resample_rate(resample_hz)
         self.timer.start(30)
         self.flay_file_writer_paraChangedSignal.emit(True)
         self.flay_file_writer = True
@@ -275,8 +424,25 @@ class Plugin(Plugin_Base):
     def _write_status_changed(self, status: bool):
         self.status_indicator.set_status(status)
         if not status: # if completed one cycle
-            self.on_button_tmp_file_save_handle()
-            pass
+            try:
+                self.on_button_tmp_file_save_handle()
+            finally:
+                self._dump_profile()
+
+    def _dump_profile(self):
+        """导出本次录制的分段计时, 并清空记录"""
+        prof = profiler.ACTIVE
+        if prof is None or not len(prof):
+            return
+        path = os.path.join(self.fileWriter.get_tmp_file_path(), f"hgr_trace_{perf_counter_ns()}.json")
+        try:
+            prof.dump(path)
+        except OSError as e:
+            print(f"导出计时记录失败: {e}")
+            return
+        finally:
+            prof.clear()
+        print(f"计时记录已保存到:{path}")
 
     def _init_buttons(self) -> QGridLayout:
         # 按钮创建
@@ -293,6 +459,7 @@ class Plugin(Plugin_Base):
             ('打开临时文件', 'btn_tmp_file', 'on_button_tmp_file_open_clicked_handle'),
             ('保存文件', 'btn_save', 'on_button_tmp_file_save_handle'),
             ('显示通知', 'btn_notification', '_show_test_notification'),
+            ('加载模板', 'btn_templates', 'on_button_load_templates_handle'),
         ]
 
         # 按顺序创建并添加按钮
@@ -319,147 +486,53 @@ class Plugin(Plugin_Base):
 
     def onDel(self):
         self.fileWriter.close()  # 窗口关闭时手动清理
+        if self.stream_server is not None:
+            self.stream_server.stop_thread()
+        if self.inference_stage is not None:
+            self.inference_stage.close()
 
 class FileWriter(QObject):
-    acc_x, acc_y, acc_z, gyro_x, gyro_y, gyro_z = 0, 0, 0, 0, 0, 0
-    acc_ready = False
-    gyro_ready = False
+    """接收解析后的帧块 (writeSignal), 配对后写入临时文件, 实现见 recorder_core"""
+
     def __init__(self, parent=None):
         super().__init__(parent)
-        fd, self.temp_path = tempfile.mkstemp(suffix='.txt', text=True)
-        self.temp_file = os.fdopen(fd, 'w+t')  # 转换为文件对象
-        print("临时文件路径:", self.temp_path)
-        self._format_header()
-
-        atexit.register(self._cleanup)
+        self.assembler = SampleAssembler()
+        self.recording = RecordingFile()
 
     def re_init(self):
-        self._cleanup()
-        self.__init__()
-
-    def add_header(self, info: DatabaseInfo):
-        """初始化文件头"""
-        self.write_to_head(
-            f"# data_set_name:{info.data_set_name}\n"
-            f"# collection_date:{info.collection_date}\n"
-            f"# participant_id:{info.participant_id}\n"
-            f"# gesture_type:{info.gesture_type}\n"
-            f"# collection_count:{info.collection_count}\n"
-            f"# sensor_type:{info.sensor_type}\n"
-            f"# sampling_frequency:{info.sampling_frequency}\n"
-            f"# encode_format:{info.encode_format}\n"
-            f"#{info.annotation}\n"
-            f"{info.data_format}\n"
-        )
+        self.assembler.reset()
+        self.recording.re_init()
 
-    def _format_header(self):
-        header = (
-            f"# data_set_name:{InitInfo.data_set_name}\n"
-            f"# collection_date:{InitInfo.collection_date}\n"
-            f"# participant_id:{InitInfo.participant_id}\n"
-            f"# gesture_type:{InitInfo.gesture_type}\n"
-            f"# collection_count:{InitInfo.collection_count}\n"
-            f"# sensor_type:{InitInfo.sensor_type}\n"
-            f"# sampling_frequency:{InitInfo.sampling_frequency}\n"
-            f"# encode_format:{InitInfo.encode_format}\n"
-            f"#{InitInfo.annotation}\n"
-            f"{InitInfo.data_format}\n"
-        )
-        self.add_header(InitInfo)
+    def set_resample_rate(self, rate_hz):
+        """设置重采样频率 (Hz), None 表示按原始时间戳写入"""
+        self.recording.set_resample_rate(rate_hz)
 
-    def write_to_head(self, text):
-        """写入到临时文件开头
-        warning:
-            写入的文本会覆盖之前的内容, 请确保文件内容不会被覆盖
-        """
-        try:
-            # 移动文件指针到文件开头
-            self.temp_file.seek(0)
-            # 写入文本数据
-            self.temp_file.write(text + '\n')
-            # 刷新缓冲区，确保数据写入文件
-            self.temp_file.flush()
-        except Exception as e:
-            print(f"写入临时文件时出错: {e}")
-
-    def write_data(self, data:tuple):
+    def write_data(self, frames: SampleBlock, emitted_ns: int = 0):
         """write data to file"""
-        uint8_val, float1, float2, float3 = data
-        if uint8_val == 0x01:
-            self.acc_ready = True
-            self.acc_x, self.acc_y, self.acc_z = float1, float2, float3
-        elif uint8_val == 0x02:
-            self.gyro_ready = True
-            self.gyro_x, self.gyro_y, self.gyro_z = float1, float2, float3
-
-        if self.acc_ready and self.gyro_ready:
-            self.acc_ready = False
-            self.gyro_ready = False
-            self.write_to_end(
-                f"{perf_counter_ns()},"
-                f"{self.acc_x},{self.acc_y},{self.acc_z},{self.gyro_x},{self.gyro_y},{self.gyro_z}\n"
-            )
-
-    def write_to_end(self, text):
-        """写入到临时文件末尾"""
-        try:
-            # 移动文件指针到文件末尾
-            self.temp_file.seek(0, 2)
-            # 写入文本数据
-            self.temp_file.write(text)
-            # 刷新缓冲区，确保数据写入文件
-            self.temp_file.flush()
-        except Exception as e:
-            print(f"写入临时文件时出错: {e}")
+        prof = profiler.ACTIVE
+        if prof is not None:
+            start = perf_counter_ns()
+            if emitted_ns:
+                prof.record(profiler.WRITE_SIGNAL, emitted_ns, start)
+        self.recording.write_block(self.assembler.push_block(frames))
+        if prof is not None:
+            prof.record(profiler.WRITE_DATA, start, perf_counter_ns())
+
+    def check_rate(self, info: DatabaseInfo):
+        """按文件头声明的采样频率检查实际采样率, 无法比较时返回 None"""
+        return self.recording.check_rate(info)
 
     def read_text_from_temp_file(self):
-        """从临时文件中读取文本数据"""
-        try:
-            # 移动文件指针到文件开头
-            self.temp_file.seek(0)
-            # 读取所有文本数据
-            content = self.temp_file.read()
-            return content
-        except Exception as e:
-            print(f"读取临时文件时出错: {e}")
-            return ""
+        return self.recording.read_text_from_temp_file()
 
     def save_as_file(self, path: str, info:DatabaseInfo) -> bool:
-        """
-        [手势类型]_[参与者ID]_[采集次数]_[时间戳].扩展名
-
-        Args:
-            path (str): 目标文件路径
-            info (DatabaseInfo): contains basic info of data set
-        """
-        try:
-            self.add_header(info)
-            self.temp_file.flush()
-            shutil.copy(self.temp_path, path)
-            return True
-        except Exception as e:
-            print(f"另存文件失败: {e}")
-            return False
+        return self.recording.save_as_file(path, info)
 
     def get_tmp_file_path(self) -> str:
-        temp_file_path = self.temp_path
-        temp_folder = os.path.dirname(temp_file_path)
-        return temp_folder
-
-    def _cleanup(self):
-        """清理临时文件"""
-        if hasattr(self, 'temp_file') and not self.temp_file.closed:
-            self.temp_file.close()
-
-        if hasattr(self, 'temp_path') and os.path.exists(self.temp_path):
-            try:
-                os.unlink(self.temp_path)  # 删除临时文件
-                print(f"已删除临时文件: {self.temp_path}")
-            except Exception as e:
-                print(f"删除临时文件失败: {e}")
+        return self.recording.get_tmp_file_path()
 
     def close(self):
-        self._cleanup()
+        self.recording.close()
 
 class ParameterSettingWidget(QWidget):
     parameterChangedSignal = pyqtSignal(DatabaseInfo, str)
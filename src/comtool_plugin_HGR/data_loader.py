@@ -0,0 +1,161 @@
+"""
+录制文件读取：解析插件保存的 CSV 格式
+
+文件格式：
+    # key:value           (若干行, 见 record_format.HEADER_KEYS)
+    #<annotation>
+    timestamp,acc_x,acc_y,acc_z,gyro_x,gyro_y,gyro_z
+    <timestamp>,<acc_x>,...,<gyro_z>
+
+用法：
+    python data_loader.py <CSV 目录> [--workers N] [--benchmark]
+"""
+import argparse
+import csv
+import os
+import sys
+from multiprocessing import Pool
+from time import perf_counter
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from record_format import DatabaseInfo, parse_header
+
+CHANNELS = 6
+# 一行数据: int64 时间戳 (ns) + 6 个 float32
+ROW_DTYPE = np.dtype([("timestamp", "<i8"), ("values", "<f4", (CHANNELS,))])
+
+
+class Recording(NamedTuple):
+    info: DatabaseInfo
+    timestamps: np.ndarray  # int64[rows]
+    values: np.ndarray      # float32[rows, 6]
+
+
+def find_recordings(src_dir: str) -> List[Tuple[str, str]]:
+    """递归查找录制文件，返回 (相对路径键, 绝对路径) 列表"""
+    tasks = []
+    for root, _, files in os.walk(src_dir):
+        for name in files:
+            if name.lower().endswith(".csv"):
+                path = os.path.join(root, name)
+                key = os.path.relpath(path, src_dir).replace(os.sep, "/")
+                tasks.append((key, path))
+    tasks.sort()
+    return tasks
+
+
+def read_header(path: str) -> DatabaseInfo:
+    """只读取文件头"""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        info, _ = parse_header(f)
+    return info
+
+
+def _parse_body(lines: Sequence[str]) -> np.ndarray:
+    """批量解析数据行，解析失败时丢弃列数不对的行后重试"""
+    try:
+        return np.loadtxt(lines, delimiter=",", dtype=ROW_DTYPE, ndmin=1)
+    except ValueError:
+        pass
+    lines = [line for line in lines if line.count(",") == CHANNELS]
+    rows = np.empty(len(lines), dtype=ROW_DTYPE)
+    count = 0
+    for line in lines:
+        try:
+            fields = line.split(",")
+            rows[count] = (int(fields[0]), [float(x) for x in fields[1:]])
+            count += 1
+        except ValueError:
+            continue
+    return rows[:count]
+
+
+def load_recording(path: str) -> Recording:
+    """读取单个录制文件"""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        lines = f.read().splitlines()
+    info, header_lines = parse_header(lines)
+    body = [line for line in lines[header_lines:] if line]
+    rows = _parse_body(body) if body else np.empty(0, dtype=ROW_DTYPE)
+    return Recording(info,
+                     np.ascontiguousarray(rows["timestamp"]),
+                     np.ascontiguousarray(rows["values"]))
+
+
+def load_recordings(paths: Sequence[str], workers: Optional[int] = None,
+                    chunksize: int = 16) -> List[Recording]:
+    """用进程池并行读取多个录制文件，返回顺序与 paths 一致"""
+    if workers == 1 or len(paths) <= chunksize:
+        return [load_recording(path) for path in paths]
+    with Pool(processes=workers) as pool:
+        return pool.map(load_recording, paths, chunksize=chunksize)
+
+
+def load_directory(src_dir: str, workers: Optional[int] = None) -> List[Tuple[str, Recording]]:
+    """读取目录下全部录制文件，返回 (相对路径键, Recording) 列表"""
+    tasks = find_recordings(src_dir)
+    recordings = load_recordings([path for _, path in tasks], workers)
+    return [(key, rec) for (key, _), rec in zip(tasks, recordings)]
+
+
+def _load_recording_naive(path: str) -> Recording:
+    """基准对照：csv.reader 逐行解析"""
+    timestamps = []
+    values = []
+    with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        info, _ = parse_header(f)
+        for row in csv.reader(f):
+            if len(row) != CHANNELS + 1:
+                continue
+            try:
+                timestamp = int(row[0])
+                value = [float(x) for x in row[1:]]
+            except ValueError:
+                continue
+            timestamps.append(timestamp)
+            values.append(value)
+    return Recording(info,
+                     np.array(timestamps, dtype=np.int64),
+                     np.array(values, dtype=np.float32).reshape(-1, CHANNELS))
+
+
+def benchmark(paths: Sequence[str], workers: Optional[int] = None):
+    """比较 csv.reader、批量解析、批量解析 + 进程池的耗时"""
+    cases = [
+        ("csv.reader", lambda: [_load_recording_naive(p) for p in paths]),
+        ("numpy", lambda: load_recordings(paths, workers=1)),
+        ("numpy + pool", lambda: load_recordings(paths, workers=workers)),
+    ]
+    baseline = None
+    for name, func in cases:
+        start = perf_counter()
+        result = func()
+        elapsed = perf_counter() - start
+        rows = sum(len(rec.timestamps) for rec in result)
+        baseline = baseline or elapsed
+        print(f"{name:<14} {elapsed:8.3f}s  {rows} 行  x{baseline / elapsed:.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="读取 CSV 录制文件")
+    parser.add_argument("src", help="CSV 录制文件所在目录")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="解析进程数, 默认为 CPU 核数")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="与 csv.reader 逐行解析比较耗时")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        benchmark([path for _, path in find_recordings(args.src)], args.workers)
+        return 0
+
+    for key, rec in load_directory(args.src, args.workers):
+        print(f"{key}: {rec.info.gesture_type} {rec.info.participant_id} "
+              f"#{rec.info.collection_count} {len(rec.timestamps)} 行")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
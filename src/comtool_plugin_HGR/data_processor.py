@@ -1,12 +1,16 @@
 import struct
 from PyQt5.QtCore import QObject, pyqtSignal
 from typing import Tuple, Optional
+from time import perf_counter_ns
+from recorder_core import FrameParser, SampleBlock
+import profiler
 # 移除未使用的导入
 # from typing import List
 
 class FloatFrameParser(QObject):
     """
     解析格式：[0xAA, uint8, float32, float32, float32, 0xEE]
+    解析逻辑见 recorder_core.FrameParser, 这里只负责发射 Qt 信号
     """
     # 调整信号参数数量，去掉多余的参数
     frame_parsed = pyqtSignal(int, float, float, float)  # (uint8, float1, float2, float3)
@@ -14,11 +18,11 @@ class FloatFrameParser(QObject):
 
     def __init__(self):
         super().__init__()
-        self.FRAME_HEAD = 0xAA
-        self.FRAME_TAIL = 0xEE
-        # 修正格式字符串，使用 'B' 表示无符号字节
-        self.FRAME_FORMAT = '=Bfff'  # uint8 + 3个float32 (小端序)
-        self._frame_size = struct.calcsize(self.FRAME_FORMAT) + 2  # 加上头和尾
+        self._parser = FrameParser()
+        self.FRAME_HEAD = FrameParser.FRAME_HEAD
+        self.FRAME_TAIL = FrameParser.FRAME_TAIL
+        self.FRAME_FORMAT = FrameParser.FRAME_FORMAT
+        self._frame_size = self._parser.frame_size
 
     def parse_frame(self, raw_data: bytes) \
             -> Optional[Tuple[
@@ -28,20 +32,21 @@ class FloatFrameParser(QObject):
                 float,
             ]]:
         """解析数据帧"""
-        # 基础检查
-        if len(raw_data) != self._frame_size:
-            return None
-        if raw_data[0] != self.FRAME_HEAD or raw_data[-1] != self.FRAME_TAIL:
-            return None
+        return self._parser.parse_frame(raw_data)
 
-        try:
-            # 提取数据部分 (去掉头尾)
-            data_part = raw_data[1:-1]
-            # 解析二进制数据，调整解包参数数量
-            uint8_val, float1, float2, float3 = struct.unpack(self.FRAME_FORMAT, data_part)
-            return uint8_val, float1, float2, float3
-        except struct.error:
-            return None
+    def parse_block(self, raw_data: bytes, timestamp_ns: int) -> SampleBlock:
+        """解析一块字节流, 返回其中所有完整帧组成的帧块"""
+        prof = profiler.ACTIVE
+        if prof is None:
+            return self._parser.feed_block(raw_data, timestamp_ns)
+        start = perf_counter_ns()
+        frames = self._parser.feed_block(raw_data, timestamp_ns)
+        prof.record(profiler.PARSE_FRAME, start, perf_counter_ns())
+        return frames
+
+    def reset(self):
+        """丢弃缓冲区中不完整的帧"""
+        self._parser.reset()
 
     def process_raw_data(self, raw_data: bytes):
         """处理原始数据并发射信号"""
@@ -0,0 +1,187 @@
+"""
+数据集压缩工具：把大量小 CSV 录制文件打包成若干大分片文件 + 偏移索引
+
+分片内每条录制的二进制布局 (小端序)：
+    int64[rows]        timestamp
+    float32[rows, 6]   acc_x, acc_y, acc_z, gyro_x, gyro_y, gyro_z
+
+索引 index.json 记录每条录制所在分片、偏移、行数和文件头信息，
+读取任意一条录制只需一次 seek + 一次 read。
+
+用法：
+    python dataset_packer.py <CSV 目录> <输出目录> [--shard-size MB] [--workers N]
+"""
+import argparse
+import json
+import os
+import sys
+from dataclasses import asdict
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from data_loader import CHANNELS, find_recordings, load_recording
+from record_format import DatabaseInfo
+
+INDEX_FILE_NAME = "index.json"
+INDEX_VERSION = 1
+SHARD_NAME_FORMAT = "shard-{:05d}.bin"
+TIMESTAMP_DTYPE = np.dtype("<i8")
+VALUE_DTYPE = np.dtype("<f4")
+ROW_NBYTES = TIMESTAMP_DTYPE.itemsize + CHANNELS * VALUE_DTYPE.itemsize
+
+
+def _pack_worker(task: Tuple[str, str]):
+    """子进程：解析文件并序列化为分片内的二进制布局"""
+    key, path = task
+    try:
+        info, timestamps, values = load_recording(path)
+    except (OSError, ValueError) as e:
+        return key, None, 0, str(e)
+    payload = timestamps.tobytes() + np.ascontiguousarray(values).tobytes()
+    return key, asdict(info), len(timestamps), payload
+
+
+def pack_dataset(src_dir: str, out_dir: str, shard_size: int = 256 * 1024 * 1024,
+                 workers: Optional[int] = None) -> dict:
+    """
+    打包数据集
+
+    Args:
+        src_dir (str): CSV 录制文件所在目录
+        out_dir (str): 输出目录
+        shard_size (int): 单个分片的目标大小 (字节)
+        workers (int): 解析进程数, 默认为 CPU 核数
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = find_recordings(src_dir)
+    shards = []
+    recordings = []
+    failed = []
+    shard_file = None
+    offset = 0
+
+    with Pool(processes=workers) as pool:
+        # imap 保持输入顺序，分片内录制按文件名排序
+        for key, info, rows, payload in pool.imap(_pack_worker, tasks, chunksize=64):
+            if info is None:
+                failed.append({"key": key, "error": payload})
+                continue
+            if shard_file is None or (offset > 0 and offset + len(payload) > shard_size):
+                if shard_file is not None:
+                    shard_file.close()
+                shards.append(SHARD_NAME_FORMAT.format(len(shards)))
+                shard_file = open(os.path.join(out_dir, shards[-1]), "wb")
+                offset = 0
+            shard_file.write(payload)
+            recordings.append({
+                "key": key,
+                "shard": len(shards) - 1,
+                "offset": offset,
+                "rows": rows,
+                "info": info,
+            })
+            offset += len(payload)
+
+    if shard_file is not None:
+        shard_file.close()
+
+    index = {
+        "version": INDEX_VERSION,
+        "channels": CHANNELS,
+        "shards": shards,
+        "recordings": recordings,
+        "failed": failed,
+    }
+    with open(os.path.join(out_dir, INDEX_FILE_NAME), "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    return index
+
+
+class ShardedDataset:
+    """
+    随机访问打包后的数据集
+
+    dataset = ShardedDataset(out_dir)
+    info, timestamps, values = dataset[0]
+    info, timestamps, values = dataset["wave_P001_3.csv"]
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE_NAME), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") != INDEX_VERSION:
+            raise ValueError(f"不支持的索引版本: {index.get('version')}")
+        self.shards = index["shards"]
+        self.recordings = index["recordings"]
+        self._key_to_pos: Dict[str, int] = {
+            rec["key"]: i for i, rec in enumerate(self.recordings)
+        }
+        self._handles = {}
+
+    def __len__(self):
+        return len(self.recordings)
+
+    def keys(self) -> List[str]:
+        return [rec["key"] for rec in self.recordings]
+
+    def info(self, item: Union[int, str]) -> DatabaseInfo:
+        """只读取文件头信息，不访问分片"""
+        return DatabaseInfo(**self._entry(item)["info"])
+
+    def __getitem__(self, item: Union[int, str]) -> Tuple[DatabaseInfo, np.ndarray, np.ndarray]:
+        entry = self._entry(item)
+        rows = entry["rows"]
+        f = self._handle(entry["shard"])
+        f.seek(entry["offset"])
+        buf = f.read(rows * ROW_NBYTES)
+        timestamps = np.frombuffer(buf, dtype=TIMESTAMP_DTYPE, count=rows)
+        values = np.frombuffer(buf, dtype=VALUE_DTYPE, count=rows * CHANNELS,
+                               offset=rows * TIMESTAMP_DTYPE.itemsize).reshape(rows, CHANNELS)
+        return DatabaseInfo(**entry["info"]), timestamps, values
+
+    def _entry(self, item: Union[int, str]) -> dict:
+        if isinstance(item, str):
+            return self.recordings[self._key_to_pos[item]]
+        return self.recordings[item]
+
+    def _handle(self, shard: int):
+        f = self._handles.get(shard)
+        if f is None:
+            f = open(os.path.join(self.path, self.shards[shard]), "rb")
+            self._handles[shard] = f
+        return f
+
+    def close(self):
+        for f in self._handles.values():
+            f.close()
+        self._handles.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把 CSV 录制文件打包为分片数据集")
+    parser.add_argument("src", help="CSV 录制文件所在目录")
+    parser.add_argument("out", help="输出目录")
+    parser.add_argument("--shard-size", type=int, default=256,
+                        help="单个分片的目标大小 (MB), 默认 256")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="解析进程数, 默认为 CPU 核数")
+    args = parser.parse_args(argv)
+
+    index = pack_dataset(args.src, args.out, args.shard_size * 1024 * 1024, args.workers)
+    print(f"已打包 {len(index['recordings'])} 条录制到 {len(index['shards'])} 个分片: {args.out}")
+    for item in index["failed"]:
+        print(f"解析失败: {item['key']}: {item['error']}", file=sys.stderr)
+    return 0 if not index["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+无界面录制器：不依赖 COMTool / PyQt5, 直接从串口设备、pty 或文件/FIFO 读取数据
+
+用法：
+    python headless_recorder.py /dev/ttyUSB0 --baud 115200 --gesture wave --participant P001 \\
+        --sessions 10 --duration 3 --output ~/Documents/HGR_database
+"""
+import argparse
+import os
+import selectors
+import stat
+import sys
+from dataclasses import replace
+from datetime import date
+from time import monotonic
+from typing import Optional
+
+from rate_estimator import parse_sampling_frequency
+from record_format import DatabaseInfo, InitInfo
+from recorder_core import Recorder
+
+try:
+    import termios
+    import tty
+except ImportError:  # Windows 下只支持文件/FIFO 数据源
+    termios = tty = None
+
+READ_SIZE = 64 * 1024
+
+
+def _baud_constant(baud: int) -> int:
+    try:
+        return getattr(termios, f"B{baud}")
+    except AttributeError:
+        raise ValueError(f"不支持的波特率: {baud}") from None
+
+
+def open_source(path: str, baud: Optional[int] = None) -> int:
+    """以非阻塞方式打开数据源; 串口 / pty 设置为 raw 模式"""
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_NONBLOCK", 0) | getattr(os, "O_NOCTTY", 0))
+    if termios is not None and os.isatty(fd):
+        tty.setraw(fd)
+        if baud:
+            attrs = termios.tcgetattr(fd)
+            attrs[4] = attrs[5] = _baud_constant(baud)  # ispeed, ospeed
+            termios.tcsetattr(fd, termios.TCSANOW, attrs)
+    return fd
+
+
+class SourceReader:
+    """
+    从文件描述符读取数据
+
+    终端、pty、FIFO 用 selectors 等待可读; 普通文件不支持 select, 直接按块读取。
+    """
+
+    def __init__(self, fd: int):
+        self.fd = fd
+        self.eof = False
+        self._selector = None
+        if not stat.S_ISREG(os.fstat(fd).st_mode):
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(fd, selectors.EVENT_READ)
+
+    def read(self, timeout: float) -> bytes:
+        """等待最多 timeout 秒, 返回读到的数据 (可能为空)"""
+        if self.eof:
+            return b""
+        if self._selector is not None and not self._selector.select(timeout):
+            return b""
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return b""
+        except OSError:
+            # pty 另一端关闭时 Linux 返回 EIO
+            data = b""
+        if not data:
+            self.eof = True
+        return data
+
+    def close(self):
+        if self._selector is not None:
+            self._selector.close()
+        os.close(self.fd)
+
+
+def record_session(reader: SourceReader, recorder: Recorder, duration: Optional[float]) -> int:
+    """录制一次, 到达时长或数据源结束时返回写入的行数"""
+    deadline = None if duration is None else monotonic() + duration
+    while not reader.eof:
+        timeout = 0.1
+        if deadline is not None:
+            timeout = deadline - monotonic()
+            if timeout <= 0:
+                break
+            timeout = min(timeout, 0.1)
+        chunk = reader.read(timeout)
+        if chunk:
+            recorder.feed(chunk)
+    return recorder.rows
+
+
+def session_file_name(info: DatabaseInfo) -> str:
+    return f"{info.gesture_type}_{info.participant_id}_{info.collection_count}.csv"
+
+
+def build_info(args) -> DatabaseInfo:
+    return replace(
+        InitInfo,
+        data_set_name=args.data_set_name or InitInfo.data_set_name,
+        collection_date=args.date or date.today().isoformat(),
+        participant_id=args.participant,
+        gesture_type=args.gesture,
+        collection_count=args.count,
+        sensor_type=args.sensor or InitInfo.sensor_type,
+        sampling_frequency=args.sampling_frequency or InitInfo.sampling_frequency,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无界面 IMU 数据录制")
+    parser.add_argument("source", help="串口设备、pty 或文件/FIFO 路径")
+    parser.add_argument("--baud", type=int, default=None, help="串口波特率")
+    parser.add_argument("--output", default=".", help="保存目录")
+    parser.add_argument("--sessions", type=int, default=1, help="录制次数")
+    parser.add_argument("--duration", type=float, default=3.0,
+                        help="每次录制时长 (秒), 0 表示读到数据源结束")
+    parser.add_argument("--gesture", default=InitInfo.gesture_type, help="手势类型")
+    parser.add_argument("--participant", default=InitInfo.participant_id, help="参与者 ID")
+    parser.add_argument("--count", type=int, default=InitInfo.collection_count, help="起始采集次数")
+    parser.add_argument("--data-set-name", default=None, help="数据集名称")
+    parser.add_argument("--date", default=None, help="采集日期, 默认今天")
+    parser.add_argument("--sensor", default=None, help="传感器类型")
+    parser.add_argument("--sampling-frequency", default=None, help="采样频率, 如 50Hz")
+    parser.add_argument("--resample", action="store_true",
+                        help="按声明的采样频率重采样到均匀时间网格")
+    args = parser.parse_args(argv)
+
+    info = build_info(args)
+    resample_hz = parse_sampling_frequency(info.sampling_frequency) if args.resample else None
+    os.makedirs(args.output, exist_ok=True)
+
+    reader = SourceReader(open_source(args.source, args.baud))
+    recorder = Recorder(resample_hz)
+    try:
+        for _ in range(args.sessions):
+            rows = record_session(reader, recorder, args.duration or None)
+            path = os.path.join(args.output, session_file_name(info))
+            if not recorder.save_as_file(path, info):
+                return 1
+            print(f"文件已保存到:{path} ({rows} 行)")
+            report = recorder.check_rate(info)
+            if report is not None:
+                print(report.describe())
+            info = replace(info, collection_count=info.collection_count + 1)
+            if reader.eof:
+                break
+            recorder.new_session()
+    except KeyboardInterrupt:
+        print("录制已中断")
+    finally:
+        recorder.close()
+        reader.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""
+在线识别：在解析器之后维护滑动窗口，每 N 个样本在工作线程中调用一次识别模型
+
+模型只需实现 predict(window) -> (label, score)，window 为 float32[window_size, 6]。
+TemplateClassifier 是只依赖 NumPy 的参考实现：用已保存的录制文件做模板，
+通过 TemplateIndex 按 DTW 距离做最近邻匹配。
+"""
+import queue
+import threading
+from collections import Counter
+from time import perf_counter_ns
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from data_loader import CHANNELS
+from recorder_core import SampleAssembler, SampleBlock
+from template_index import TemplateIndex
+
+
+class RingBuffer:
+    """
+    预分配的环形缓冲区
+
+    每个样本同时写入 i 和 i + capacity 两个位置，最近 capacity 个样本
+    始终是一段连续内存，取窗口不需要拼接。
+    """
+
+    def __init__(self, capacity: int, channels: int = CHANNELS):
+        self.capacity = capacity
+        self._values = np.zeros((2 * capacity, channels), dtype=np.float32)
+        self._timestamps = np.zeros(2 * capacity, dtype=np.int64)
+        self._pos = 0
+        self.count = 0
+
+    def extend(self, values: np.ndarray, timestamps: np.ndarray):
+        """批量写入样本, 超过容量时只保留最后 capacity 个"""
+        total = len(values)
+        if total == 0:
+            return
+        capacity = self.capacity
+        values = values[-capacity:]
+        timestamps = timestamps[-capacity:]
+        n = len(values)
+        pos = self._pos
+        first = min(n, capacity - pos)
+        rest = n - first
+        for target, source in ((self._values, values), (self._timestamps, timestamps)):
+            target[pos:pos + first] = source[:first]
+            target[pos + capacity:pos + capacity + first] = source[:first]
+            if rest:
+                target[:rest] = source[first:]
+                target[capacity:capacity + rest] = source[first:]
+        self._pos = (pos + n) % capacity
+        self.count += total
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def window(self) -> Tuple[np.ndarray, np.ndarray]:
+        """返回最近 capacity 个样本 (视图, 调用者需要时自行复制)"""
+        start = self._pos
+        end = start + self.capacity
+        return self._timestamps[start:end], self._values[start:end]
+
+    def clear(self):
+        self._pos = 0
+        self.count = 0
+
+
+class TemplateClassifier:
+    """基于 DTW 的 k 近邻模板匹配, 模板存放在 TemplateIndex 中"""
+
+    def __init__(self, index: TemplateIndex, k: int = 1, window_size: Optional[int] = None):
+        if len(index) == 0:
+            raise ValueError("没有可用的模板")
+        self.index = index
+        self.k = k
+        self.window_size = window_size or int(np.median(index.raw_lengths))
+
+    @classmethod
+    def from_directory(cls, path: str, **kwargs) -> "TemplateClassifier":
+        """用目录下已保存的录制文件构建模板, 标签取文件头中的 gesture_type"""
+        return cls(TemplateIndex.from_directory(path), **kwargs)
+
+    @property
+    def labels(self) -> List[str]:
+        return [info.gesture_type for info in self.index.infos]
+
+    def predict(self, window: np.ndarray) -> Tuple[str, float]:
+        nearest = self.index.query(window, k=self.k)
+        votes = Counter(self.index.infos[pos].gesture_type for _, pos in nearest)
+        label = votes.most_common(1)[0][0]
+        score = min(distance for distance, pos in nearest
+                    if self.index.infos[pos].gesture_type == label)
+        return label, score
+
+
+class InferenceResult(NamedTuple):
+    label: str
+    score: float
+    arrival_ns: int      # 窗口中最新样本到达的时间
+    finished_ns: int     # 识别完成的时间
+
+    @property
+    def latency_ms(self) -> float:
+        return (self.finished_ns - self.arrival_ns) / 1e6
+
+
+class InferenceStage:
+    """
+    stage = InferenceStage(model, on_result)
+    stage.push_block(frames)    # 在接收线程中调用, frames 为解析器输出的帧块
+
+    每收到 hop 个样本提交一次窗口; 工作线程忙时直接跳过该窗口,
+    不会在接收线程中排队或阻塞。
+    """
+
+    def __init__(self, model, on_result: Callable[[InferenceResult], None],
+                 window_size: Optional[int] = None, hop: int = 10):
+        self.model = model
+        self.on_result = on_result
+        self.hop = hop
+        self.buffer = RingBuffer(window_size or getattr(model, "window_size", 100))
+        self.assembler = SampleAssembler()
+        self.skipped = 0
+        self._since_last = 0
+        self._queue: "queue.Queue[Optional[Tuple[np.ndarray, int]]]" = queue.Queue(maxsize=1)
+        self._worker = threading.Thread(target=self._run, name="hgr-inference", daemon=True)
+        self._worker.start()
+
+    def push_block(self, frames: SampleBlock):
+        samples = self.assembler.push_block(frames)
+        if not len(samples):
+            return
+        timestamps = samples.timestamp_array()
+        self.buffer.extend(samples.value_array(), timestamps)
+        self._since_last += len(samples)
+        self._submit(int(timestamps[-1]))
+
+    def _submit(self, arrival_ns: int):
+        """每累计 hop 个样本提交一次最近的窗口"""
+        if self._since_last < self.hop or not self.buffer.full:
+            return
+        self._since_last = 0
+        _, values = self.buffer.window()
+        try:
+            self._queue.put_nowait((values.copy(), arrival_ns))
+        except queue.Full:
+            self.skipped += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            window, arrival_ns = item
+            try:
+                label, score = self.model.predict(window)
+            except Exception as e:
+                print(f"识别出错: {e}")
+                continue
+            self.on_result(InferenceResult(label, score, arrival_ns, perf_counter_ns()))
+
+    def close(self):
+        # 丢弃未处理的窗口, 通知工作线程退出
+        try:
+            self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        self._queue.put(None)
+        self._worker.join()
+
+
+def latency_summary(latencies_ms: List[float]) -> str:
+    if not latencies_ms:
+        return "-"
+    array = np.asarray(latencies_ms)
+    return f"{np.median(array):.1f}ms (p95 {np.percentile(array, 95):.1f}ms)"
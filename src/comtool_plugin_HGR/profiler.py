@@ -0,0 +1,142 @@
+"""
+采集过程分段计时：记录各处理阶段的耗时，录制结束后导出为 Chrome trace-event JSON
+(chrome://tracing 或 https://ui.perfetto.dev 打开)
+
+默认关闭, ACTIVE 为 None, 埋点处只多一次判断:
+
+    prof = profiler.ACTIVE
+    if prof is not None:
+        start = perf_counter_ns()
+    ...
+    if prof is not None:
+        prof.record(profiler.WRITE_DATA, start, perf_counter_ns())
+"""
+import itertools
+import json
+import os
+import threading
+from array import array
+from typing import Dict, List, Optional
+
+_get_ident = threading.get_ident
+
+# 固定的阶段编号
+ON_RECEIVED = 0
+PARSE_FRAME = 1
+WRITE_SIGNAL = 2   # writeSignal 发射 -> 槽函数开始执行 (Qt 跨线程排队)
+WRITE_DATA = 3
+WRITE_TO_END = 4
+SPAN_NAMES = ("onReceived", "parse_frame", "writeSignal", "write_data", "write_to_end")
+
+
+class SpanRecorder:
+    """
+    预分配的环形缓冲区, 只保存最近 capacity 个时间段
+
+    record 可在多个线程中调用: 写入位置由 itertools.count 分配 (GIL 下原子),
+    不需要加锁; 已写入数 _written 只增不减。
+    """
+
+    def __init__(self, capacity: int = 1 << 16):
+        # 容量取 2 的幂, 用位与代替取模
+        capacity = 1 << max(capacity - 1, 1).bit_length()
+        self.capacity = capacity
+        self._mask = capacity - 1
+        self._starts = array('q', bytes(8 * capacity))
+        self._ends = array('q', bytes(8 * capacity))
+        self._threads = array('Q', bytes(8 * capacity))
+        self._spans = array('H', bytes(2 * capacity))
+        self._counter = itertools.count()
+        self._written = 0
+
+    def record(self, span: int, start_ns: int, end_ns: int):
+        n = next(self._counter)
+        i = n & self._mask
+        self._starts[i] = start_ns
+        self._ends[i] = end_ns
+        self._spans[i] = span
+        self._threads[i] = _get_ident()
+        # 线程在此之前被切换时, 后写入的线程可能已经更新过, 不能回退
+        if n >= self._written:
+            self._written = n + 1
+
+    def __len__(self):
+        return min(self._written, self.capacity)
+
+    @property
+    def dropped(self) -> int:
+        """被覆盖的最早记录数"""
+        return max(0, self._written - self.capacity)
+
+    def clear(self):
+        self._counter = itertools.count()
+        self._written = 0
+
+    def trace_events(self) -> List[dict]:
+        """按时间顺序生成 Chrome trace-event 列表"""
+        count = len(self)
+        first = (self._written - count) & self._mask
+        thread_names: Dict[int, str] = {t.ident: t.name for t in threading.enumerate()}
+        pid = os.getpid()
+        events = []
+        seen_threads = set()
+        for k in range(count):
+            i = (first + k) & self._mask
+            tid = self._threads[i]
+            seen_threads.add(tid)
+            start = self._starts[i]
+            events.append({
+                "name": SPAN_NAMES[self._spans[i]],
+                "ph": "X",
+                "ts": start / 1000,
+                "dur": (self._ends[i] - start) / 1000,
+                "pid": pid,
+                "tid": tid,
+            })
+        events.sort(key=lambda event: event["ts"])
+        for tid in seen_threads:
+            events.append({
+                "name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                "args": {"name": thread_names.get(tid, str(tid))},
+            })
+        return events
+
+    def summary(self) -> Dict[str, dict]:
+        """各阶段的次数、总耗时和最大耗时 (µs)"""
+        stats: Dict[str, dict] = {}
+        count = len(self)
+        first = (self._written - count) & self._mask
+        for k in range(count):
+            i = (first + k) & self._mask
+            duration = (self._ends[i] - self._starts[i]) / 1000
+            item = stats.setdefault(SPAN_NAMES[self._spans[i]], {"count": 0, "total_us": 0.0, "max_us": 0.0})
+            item["count"] += 1
+            item["total_us"] += duration
+            item["max_us"] = max(item["max_us"], duration)
+        return stats
+
+    def dump(self, path: str):
+        """导出为 Chrome trace-event JSON 文件"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "traceEvents": self.trace_events(),
+                "displayTimeUnit": "ns",
+                "otherData": {"dropped": self.dropped, "summary": self.summary()},
+            }, f)
+
+
+# 当前启用的记录器, None 表示未启用
+ACTIVE: Optional[SpanRecorder] = None
+
+
+def enable(capacity: int = 1 << 16) -> SpanRecorder:
+    global ACTIVE
+    if ACTIVE is None:
+        ACTIVE = SpanRecorder(capacity)
+    return ACTIVE
+
+
+def disable() -> Optional[SpanRecorder]:
+    global ACTIVE
+    recorder, ACTIVE = ACTIVE, None
+    return recorder
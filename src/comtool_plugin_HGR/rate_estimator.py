@@ -0,0 +1,202 @@
+"""
+采样率估计与重采样
+
+RateEstimator 根据相邻样本的时间戳 (ns) 流式估计实际采样率，
+并与文件头中声明的 sampling_frequency ("50Hz") 比较。
+BlockResampler 按块把不等间隔的样本线性插值到均匀时间网格上。
+"""
+import re
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+NS_PER_SECOND = 1_000_000_000
+_FREQUENCY_PATTERN = re.compile(r"^\s*([0-9]*\.?[0-9]+)\s*(k?hz)?\s*$", re.IGNORECASE)
+
+
+def parse_sampling_frequency(text: str) -> float:
+    """解析 "50Hz" / "1kHz" / "50" 形式的采样频率，返回 Hz"""
+    match = _FREQUENCY_PATTERN.match(str(text))
+    if match is None:
+        raise ValueError(f"无法解析采样频率: {text!r}")
+    value = float(match.group(1))
+    if (match.group(2) or "").lower() == "khz":
+        value *= 1000
+    if value <= 0:
+        raise ValueError(f"采样频率必须大于 0: {text!r}")
+    return value
+
+
+class RateReport(NamedTuple):
+    declared_hz: float
+    measured_hz: float
+    jitter: float       # 采样间隔的变异系数 (std / mean)
+    max_gap_ns: int     # 最大采样间隔
+    samples: int
+    ok: bool
+
+    def describe(self) -> str:
+        state = "正常" if self.ok else "不符"
+        return (f"采样率{state}: 声明 {self.declared_hz:g}Hz, "
+                f"实际 {self.measured_hz:.2f}Hz, 抖动 {self.jitter:.1%}")
+
+
+class RateEstimator:
+    """流式采样率估计 (Welford 算法统计采样间隔)"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.samples = 0
+        self.first_ns = 0
+        self.last_ns = 0
+        self.max_gap_ns = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, timestamp_ns: int):
+        """加入一个样本时间戳"""
+        if self.samples:
+            interval = timestamp_ns - self.last_ns
+            n = self.samples  # 间隔数 = 样本数 - 1, 加入后为 n
+            delta = interval - self._mean
+            self._mean += delta / n
+            self._m2 += delta * (interval - self._mean)
+            if interval > self.max_gap_ns:
+                self.max_gap_ns = interval
+        else:
+            self.first_ns = timestamp_ns
+        self.last_ns = timestamp_ns
+        self.samples += 1
+
+    def update_block(self, timestamps: np.ndarray):
+        """加入一组时间戳 (合并块统计量，避免逐个更新)"""
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if timestamps.size == 0:
+            return
+        if self.samples:
+            intervals = np.diff(timestamps, prepend=self.last_ns)
+        else:
+            self.first_ns = int(timestamps[0])
+            intervals = np.diff(timestamps)
+        if intervals.size:
+            n_a = self.samples - 1 if self.samples else 0
+            n_b = intervals.size
+            mean_b = float(intervals.mean())
+            m2_b = float(((intervals - mean_b) ** 2).sum())
+            n = n_a + n_b
+            delta = mean_b - self._mean
+            self._mean += delta * n_b / n
+            self._m2 += m2_b + delta * delta * n_a * n_b / n
+            self.max_gap_ns = max(self.max_gap_ns, int(intervals.max()))
+        self.last_ns = int(timestamps[-1])
+        self.samples += timestamps.size
+
+    @property
+    def rate_hz(self) -> float:
+        """实际采样率, 样本不足时为 0"""
+        if self.samples < 2 or self.last_ns <= self.first_ns:
+            return 0.0
+        return (self.samples - 1) * NS_PER_SECOND / (self.last_ns - self.first_ns)
+
+    @property
+    def jitter(self) -> float:
+        if self.samples < 3 or self._mean <= 0:
+            return 0.0
+        return (self._m2 / (self.samples - 2)) ** 0.5 / self._mean
+
+    def check(self, declared_hz: float, tolerance: float = 0.05) -> RateReport:
+        """与声明的采样率比较, 相对误差超过 tolerance 视为不符"""
+        measured = self.rate_hz
+        ok = measured > 0 and abs(measured - declared_hz) <= tolerance * declared_hz
+        return RateReport(declared_hz, measured, self.jitter, self.max_gap_ns, self.samples, ok)
+
+
+def _merge_duplicates(timestamps: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """时间戳相同的样本取平均, 否则插值时只会用到其中最后一个"""
+    if timestamps.size < 2 or np.all(timestamps[1:] != timestamps[:-1]):
+        return timestamps, values
+    unique, first, counts = np.unique(timestamps, return_index=True, return_counts=True)
+    merged = np.add.reduceat(values.astype(np.float64), first, axis=0) / counts[:, None]
+    return unique, merged.astype(np.float32)
+
+
+def _interpolate(timestamps: np.ndarray, values: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    """对所有通道同时做线性插值, grid 必须落在 timestamps 范围内"""
+    timestamps, values = _merge_duplicates(timestamps, values)
+    if timestamps.size == 1:
+        return np.repeat(values, grid.size, axis=0)
+    right = np.searchsorted(timestamps, grid, side="right").clip(1, len(timestamps) - 1)
+    left = right - 1
+    span = (timestamps[right] - timestamps[left]).astype(np.float64)
+    span[span == 0] = 1.0
+    weight = ((grid - timestamps[left]) / span)[:, None]
+    return (values[left] * (1.0 - weight) + values[right] * weight).astype(np.float32)
+
+
+def resample_uniform(timestamps: np.ndarray, values: np.ndarray, rate_hz: float,
+                     length: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    把整条录制重采样到均匀时间网格
+
+    Args:
+        timestamps (np.ndarray): int64[rows], ns, 单调递增
+        values (np.ndarray): [rows, channels]
+        rate_hz (float): 目标采样率
+        length (int): 输出点数, 超出录制范围的点保持端点值; 默认覆盖整条录制
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float32)
+    if timestamps.size == 0:
+        return timestamps.copy(), values.copy()
+    period = NS_PER_SECOND / rate_hz
+    if length is None:
+        length = int((timestamps[-1] - timestamps[0]) // period) + 1
+    grid = timestamps[0] + np.round(np.arange(length) * period).astype(np.int64)
+    if timestamps.size == 1:
+        return grid, np.repeat(values, length, axis=0)
+    clipped = np.minimum(grid, timestamps[-1])
+    return grid, _interpolate(timestamps, values, clipped)
+
+
+class BlockResampler:
+    """
+    流式重采样：按块输入不等间隔样本，输出均匀网格上的样本
+
+    每块末尾的样本保留到下一块作为插值左端点，块边界处不会丢点或重复。
+    """
+
+    def __init__(self, rate_hz: float, channels: int = 6):
+        self.rate_hz = rate_hz
+        self.channels = channels
+        self._period = NS_PER_SECOND / rate_hz
+        self._origin: Optional[int] = None
+        self._next_index = 0
+        self._last_ts = np.empty(0, dtype=np.int64)
+        self._last_values = np.empty((0, channels), dtype=np.float32)
+
+    def push(self, timestamps: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """输入一块样本, 返回这一块可以确定的网格点"""
+        timestamps = np.concatenate((self._last_ts, np.asarray(timestamps, dtype=np.int64)))
+        values = np.concatenate((self._last_values,
+                                 np.asarray(values, dtype=np.float32).reshape(-1, self.channels)))
+        if timestamps.size == 0:
+            return timestamps, values
+        if self._origin is None:
+            self._origin = int(timestamps[0])
+        self._last_ts = timestamps[-1:]
+        self._last_values = values[-1:]
+
+        stop = int((timestamps[-1] - self._origin) // self._period) + 1
+        if stop <= self._next_index:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.channels), dtype=np.float32)
+        grid = self._origin + np.round(
+            np.arange(self._next_index, stop) * self._period).astype(np.int64)
+        self._next_index = stop
+        if timestamps.size == 1:
+            return grid, np.repeat(values, grid.size, axis=0)
+        return grid, _interpolate(timestamps, values, grid)
+
+    def reset(self):
+        self.__init__(self.rate_hz, self.channels)
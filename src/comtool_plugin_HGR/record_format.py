@@ -0,0 +1,80 @@
+from dataclasses import dataclass, fields
+from typing import Iterable, Tuple
+
+
+@dataclass
+class DatabaseInfo:
+    data_set_name: str
+    collection_date: str
+    participant_id: str
+    gesture_type: str
+    collection_count: int
+    sensor_type: str
+    sampling_frequency: str
+    encode_format: str
+    annotation: str
+    data_format: str
+
+InitInfo = DatabaseInfo(
+    data_set_name="手势识别项目 v1.0",
+    collection_date="0000-00-00",
+    participant_id="P000",
+    gesture_type="<UNK>",
+    collection_count=0,
+    sensor_type="BNO08x",
+    sampling_frequency="50Hz",
+    encode_format="utf-8",
+    annotation=f"{'#'*20}",
+    data_format="timestamp,acc_x,acc_y,acc_z,gyro_x,gyro_y,gyro_z"
+)
+
+# 以 "# key:value" 形式写入文件头的字段 (annotation 与 data_format 单独处理)
+HEADER_KEYS = tuple(f.name for f in fields(DatabaseInfo)
+                    if f.name not in ("annotation", "data_format"))
+
+
+def format_header(info: DatabaseInfo) -> str:
+    """生成文件头文本"""
+    lines = [f"# {key}:{getattr(info, key)}\n" for key in HEADER_KEYS]
+    lines.append(f"#{info.annotation}\n")
+    lines.append(f"{info.data_format}\n")
+    return "".join(lines)
+
+
+def parse_header(lines: Iterable[str]) -> Tuple[DatabaseInfo, int]:
+    """
+    解析文件头
+
+    Returns:
+        (DatabaseInfo, 文件头所占行数), 行数包含 data_format 列名行
+    """
+    values = {}
+    annotation = ""
+    data_format = ""
+    consumed = 0
+    for line in lines:
+        consumed += 1
+        line = line.rstrip("\r\n")
+        if line.startswith("# "):
+            key, sep, value = line[2:].partition(":")
+            if sep and key in HEADER_KEYS:
+                values[key] = value
+                continue
+        if line.startswith("#"):
+            annotation = line[1:]
+            continue
+        if not line:
+            continue
+        data_format = line
+        break
+
+    info = DatabaseInfo(
+        **{key: values.get(key, str(getattr(InitInfo, key))) for key in HEADER_KEYS},
+        annotation=annotation,
+        data_format=data_format or InitInfo.data_format,
+    )
+    try:
+        info.collection_count = int(info.collection_count)
+    except ValueError:
+        info.collection_count = 0
+    return info, consumed
@@ -0,0 +1,456 @@
+"""
+录制核心：帧解析、加速度/陀螺仪配对、临时文件写入
+
+不依赖 PyQt5，插件 (comtool_plugin_HGR.py) 和无界面录制器
+(headless_recorder.py) 共用同一套实现。
+"""
+import atexit
+import os
+from array import array
+import shutil
+import struct
+import tempfile
+from time import perf_counter_ns
+from typing import Optional, Tuple
+
+import numpy as np
+
+from rate_estimator import BlockResampler, RateReport, RateEstimator, parse_sampling_frequency
+from record_format import DatabaseInfo, InitInfo, format_header
+import profiler
+
+# 帧类型
+FRAME_ACC = 0x01
+FRAME_GYRO = 0x02
+# 重采样时每块缓存的样本数
+RESAMPLE_BLOCK_SIZE = 32
+# 两次读取间隔超过该值时视为数据流中断过, 不把帧的时间戳分摊到中断的时间上
+MAX_READ_GAP_NS = 1_000_000_000
+
+# 每行 6 轴数据: acc_x, acc_y, acc_z, gyro_x, gyro_y, gyro_z
+CHANNELS = 6
+
+Frame = Tuple[int, float, float, float]
+
+
+class SampleBlock:
+    """
+    一组连续样本的紧凑表示, 在解析器、写入器、在线识别之间整体传递
+
+    timestamps: array('q'), 每个样本的时间戳 (ns)
+    values:     array('f'), 按行连续存放, 每行 width 个值
+    kinds:      array('B'), 帧块 (width=3) 中每帧的类型, 样本块中为 None
+
+    每个样本占 8 + 4 * width 字节, 不为单个样本创建 Python 对象。
+    块创建后只读, numpy 视图 (timestamp_array / value_array) 不复制数据。
+    """
+    __slots__ = ("width", "timestamps", "values", "kinds")
+
+    def __init__(self, width: int = CHANNELS, with_kinds: bool = False):
+        self.width = width
+        self.timestamps = array('q')
+        self.values = array('f')
+        self.kinds = array('B') if with_kinds else None
+
+    @classmethod
+    def from_arrays(cls, timestamps: np.ndarray, values: np.ndarray,
+                    kinds: Optional[np.ndarray] = None) -> "SampleBlock":
+        block = cls(values.shape[1], with_kinds=kinds is not None)
+        block.timestamps.frombytes(np.ascontiguousarray(timestamps, dtype=np.int64).tobytes())
+        block.values.frombytes(np.ascontiguousarray(values, dtype=np.float32).tobytes())
+        if kinds is not None:
+            block.kinds.frombytes(np.ascontiguousarray(kinds, dtype=np.uint8).tobytes())
+        return block
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def timestamp_array(self) -> np.ndarray:
+        if not self.timestamps:
+            return np.empty(0, dtype=np.int64)
+        return np.frombuffer(self.timestamps, dtype=np.int64)
+
+    def value_array(self) -> np.ndarray:
+        if not self.values:
+            return np.empty((0, self.width), dtype=np.float32)
+        return np.frombuffer(self.values, dtype=np.float32).reshape(-1, self.width)
+
+    def kind_array(self) -> np.ndarray:
+        if not self.kinds:
+            return np.empty(0, dtype=np.uint8)
+        return np.frombuffer(self.kinds, dtype=np.uint8)
+
+    @property
+    def nbytes(self) -> int:
+        size = self.timestamps.itemsize * len(self.timestamps) + self.values.itemsize * len(self.values)
+        if self.kinds is not None:
+            size += len(self.kinds)
+        return size
+
+
+def format_rows(timestamps: np.ndarray, values: np.ndarray) -> str:
+    """把样本格式化为 CSV 数据行 (float32 按 float64 输出, 与逐帧解析时一致)"""
+    return "".join(
+        f"{t},{','.join(map(str, row))}\n"
+        for t, row in zip(timestamps.tolist(), values.astype(np.float64).tolist())
+    )
+
+
+class FrameParser:
+    """
+    解析格式：[0xAA, uint8, float32, float32, float32, 0xEE]
+    """
+    FRAME_HEAD = 0xAA
+    FRAME_TAIL = 0xEE
+    FRAME_FORMAT = '=Bfff'  # uint8 + 3个float32 (小端序)
+
+    def __init__(self):
+        self._struct = struct.Struct(self.FRAME_FORMAT)
+        self._frame_size = self._struct.size + 2  # 加上头和尾
+        self._buffer = bytearray()
+        self.invalid_bytes = 0
+        self._last_read_ns: Optional[int] = None
+        self._frame_interval_ns = 0
+
+    @property
+    def frame_size(self) -> int:
+        return self._frame_size
+
+    def parse_frame(self, raw_data: bytes) -> Optional[Frame]:
+        """解析单个完整的数据帧"""
+        # 基础检查
+        if len(raw_data) != self._frame_size:
+            return None
+        if raw_data[0] != self.FRAME_HEAD or raw_data[-1] != self.FRAME_TAIL:
+            return None
+
+        try:
+            # 解析二进制数据 (去掉头尾)
+            return self._struct.unpack_from(raw_data, 1)
+        except struct.error:
+            return None
+
+    def feed_block(self, chunk: bytes, timestamp_ns: int) -> SampleBlock:
+        """
+        解析字节流, 返回其中所有完整的帧 (width=3 的帧块)
+
+        串口读取的分块与帧边界无关, 不完整的帧留在缓冲区等待下一块;
+        从帧头开始的连续完整帧用 numpy 整体解析, 帧头帧尾不匹配时
+        向后移动一个字节重新同步。
+
+        timestamp_ns 是这一块的到达时间, 块内的帧在上一块到达时间和
+        timestamp_ns 之间均匀分配时间戳, 最后一帧为 timestamp_ns。
+        """
+        buf = self._buffer
+        buf += chunk
+        size = self._frame_size
+        end = len(buf)
+        pos = 0
+        frame_parts = []
+        # data 是 buf 的视图, 在调整 buf 大小之前必须释放
+        data = np.frombuffer(buf, dtype=np.uint8) if end else None
+        while True:
+            head = buf.find(self.FRAME_HEAD, pos)
+            if head < 0:
+                self.invalid_bytes += end - pos
+                pos = end
+                break
+            self.invalid_bytes += head - pos
+            count = (end - head) // size
+            if count == 0:
+                pos = head
+                break
+            frames = data[head:head + count * size].reshape(count, size)
+            valid = (frames[:, 0] == self.FRAME_HEAD) & (frames[:, -1] == self.FRAME_TAIL)
+            run = count if valid.all() else int(valid.argmin())
+            if run:
+                frame_parts.append(frames[:run].copy())
+                pos = head + run * size
+            else:
+                self.invalid_bytes += 1
+                pos = head + 1
+        frames = valid = data = None
+        del buf[:pos]
+
+        block = SampleBlock(3, with_kinds=True)
+        if frame_parts:
+            frames = np.concatenate(frame_parts) if len(frame_parts) > 1 else frame_parts[0]
+            block.kinds.frombytes(frames[:, 1].tobytes())
+            block.values.frombytes(frames[:, 2:size - 1].tobytes())
+            block.timestamps.frombytes(self._frame_timestamps(len(frames), timestamp_ns).tobytes())
+        if len(block) or self._last_read_ns is None:
+            self._last_read_ns = timestamp_ns
+        return block
+
+    def _frame_timestamps(self, count: int, timestamp_ns: int) -> np.ndarray:
+        last = self._last_read_ns
+        if last is not None and 0 <= timestamp_ns - last <= MAX_READ_GAP_NS:
+            span = timestamp_ns - last
+            self._frame_interval_ns = span // count
+        else:
+            # 第一次读取或中断之后: 按之前的帧间隔向前推算, 不早于上一块
+            span = self._frame_interval_ns * count
+            if last is not None and timestamp_ns > last:
+                span = min(span, timestamp_ns - last)
+        offsets = np.arange(count - 1, -1, -1, dtype=np.int64)
+        return timestamp_ns - offsets * span // count
+
+    def reset(self):
+        self._buffer.clear()
+        self.invalid_bytes = 0
+        self._last_read_ns = None
+
+
+class SampleAssembler:
+    """把加速度帧和陀螺仪帧配对成一行 6 轴数据"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # 上一块中尚未配对的帧 (最多一帧), 形状与帧块一致
+        self._carry_kinds = np.empty(0, dtype=np.uint8)
+        self._carry_values = np.empty((0, 3), dtype=np.float32)
+        self._carry_timestamps = np.empty(0, dtype=np.int64)
+
+    def push_block(self, frames: SampleBlock) -> SampleBlock:
+        """
+        加入一个帧块, 返回配对完成的样本块 (width=6)
+
+        两种帧都到齐时输出一行, 时间戳取后到的那一帧; 同类帧重复时保留最新的。
+        """
+        kinds = np.concatenate((self._carry_kinds, frames.kind_array()))
+        values = np.concatenate((self._carry_values, frames.value_array()))
+        timestamps = np.concatenate((self._carry_timestamps, frames.timestamp_array()))
+
+        acc_index = array('q')
+        gyro_index = array('q')
+        row_index = array('q')
+        acc = gyro = -1
+        for i, kind in enumerate(kinds.tobytes()):
+            if kind == FRAME_ACC:
+                acc = i
+            elif kind == FRAME_GYRO:
+                gyro = i
+            else:
+                continue
+            if acc >= 0 and gyro >= 0:
+                acc_index.append(acc)
+                gyro_index.append(gyro)
+                row_index.append(i)
+                acc = gyro = -1
+
+        pending = max(acc, gyro)
+        keep = slice(pending, pending + 1) if pending >= 0 else slice(0, 0)
+        self._carry_kinds = kinds[keep].copy()
+        self._carry_values = values[keep].copy()
+        self._carry_timestamps = timestamps[keep].copy()
+
+        if not row_index:
+            return SampleBlock(CHANNELS)
+        acc_index = np.frombuffer(acc_index, dtype=np.int64)
+        gyro_index = np.frombuffer(gyro_index, dtype=np.int64)
+        row_index = np.frombuffer(row_index, dtype=np.int64)
+        return SampleBlock.from_arrays(
+            timestamps[row_index],
+            np.concatenate((values[acc_index], values[gyro_index]), axis=1),
+        )
+
+
+class RecordingFile:
+    """录制数据先写入临时文件, 保存时补全文件头并复制到目标路径"""
+
+    def __init__(self):
+        fd, self.temp_path = tempfile.mkstemp(suffix='.txt', text=True)
+        self.temp_file = os.fdopen(fd, 'w+t', encoding='utf-8')  # 转换为文件对象
+        print("临时文件路径:", self.temp_path)
+        self.add_header(InitInfo)
+        # 数据部分的起始位置, 保存时在这之前写入最终的文件头
+        self._data_offset = self.temp_file.tell()
+        self.rate_estimator = RateEstimator()
+        self.resampler = None
+        self._pending = []  # 等待重采样的样本块
+        self._pending_rows = 0
+
+        atexit.register(self._cleanup)
+
+    def re_init(self):
+        resampler = self.resampler
+        self._cleanup()
+        self.__init__()
+        if resampler is not None:
+            self.set_resample_rate(resampler.rate_hz)
+
+    def set_resample_rate(self, rate_hz: Optional[float]):
+        """设置重采样频率 (Hz), None 表示按原始时间戳写入"""
+        self._flush_block()
+        self.resampler = BlockResampler(rate_hz) if rate_hz else None
+
+    def add_header(self, info: DatabaseInfo):
+        """初始化文件头"""
+        self.write_to_head(format_header(info))
+
+    def write_to_head(self, text):
+        """写入到临时文件开头
+        warning:
+            写入的文本会覆盖之前的内容, 请确保文件内容不会被覆盖
+        """
+        try:
+            # 移动文件指针到文件开头
+            self.temp_file.seek(0)
+            # 写入文本数据
+            self.temp_file.write(text + '\n')
+            # 刷新缓冲区，确保数据写入文件
+            self.temp_file.flush()
+        except Exception as e:
+            print(f"写入临时文件时出错: {e}")
+
+    def write_block(self, block: SampleBlock):
+        """写入一个样本块 (width=6)"""
+        if not len(block):
+            return
+        self.rate_estimator.update_block(block.timestamp_array())
+        if self.resampler is None:
+            self.write_to_end(format_rows(block.timestamp_array(), block.value_array()))
+        else:
+            # 攒够一定行数后统一插值，避免逐块计算
+            self._pending.append(block)
+            self._pending_rows += len(block)
+            if self._pending_rows >= RESAMPLE_BLOCK_SIZE:
+                self._flush_block()
+
+    def _flush_block(self):
+        """重采样缓存的样本并写入文件"""
+        pending = self._pending
+        self._pending = []
+        self._pending_rows = 0
+        if not pending or self.resampler is None:
+            return
+        timestamps = np.concatenate([block.timestamp_array() for block in pending])
+        values = np.concatenate([block.value_array() for block in pending])
+        grid, values = self.resampler.push(timestamps, values)
+        self.write_to_end(format_rows(grid, values))
+
+    def check_rate(self, info: DatabaseInfo) -> Optional[RateReport]:
+        """按文件头声明的采样频率检查实际采样率, 无法比较时返回 None"""
+        try:
+            declared = parse_sampling_frequency(info.sampling_frequency)
+        except ValueError as e:
+            print(f"无法检查采样率: {e}")
+            return None
+        if self.rate_estimator.samples < 2:
+            return None
+        return self.rate_estimator.check(declared)
+
+    def write_to_end(self, text):
+        """写入到临时文件末尾"""
+        prof = profiler.ACTIVE
+        if prof is not None:
+            start = perf_counter_ns()
+        try:
+            # 移动文件指针到文件末尾
+            self.temp_file.seek(0, 2)
+            # 写入文本数据
+            self.temp_file.write(text)
+            # 刷新缓冲区，确保数据写入文件
+            self.temp_file.flush()
+        except Exception as e:
+            print(f"写入临时文件时出错: {e}")
+        if prof is not None:
+            prof.record(profiler.WRITE_TO_END, start, perf_counter_ns())
+
+    def read_text_from_temp_file(self):
+        """从临时文件中读取文本数据"""
+        try:
+            # 移动文件指针到文件开头
+            self.temp_file.seek(0)
+            # 读取所有文本数据
+            content = self.temp_file.read()
+            return content
+        except Exception as e:
+            print(f"读取临时文件时出错: {e}")
+            return ""
+
+    def save_as_file(self, path: str, info: DatabaseInfo) -> bool:
+        """
+        [手势类型]_[参与者ID]_[采集次数]_[时间戳].扩展名
+
+        Args:
+            path (str): 目标文件路径
+            info (DatabaseInfo): contains basic info of data set
+        """
+        try:
+            self._flush_block()
+            self.temp_file.flush()
+            # 文件头长度可能与临时文件中的不同, 不能原地覆盖, 重新写头后复制数据部分
+            self.temp_file.seek(self._data_offset)
+            # 与文件头声明的 encode_format 及 data_loader 读取时一致, 不使用系统默认编码
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(format_header(info) + '\n')
+                shutil.copyfileobj(self.temp_file, f)
+            return True
+        except Exception as e:
+            print(f"另存文件失败: {e}")
+            return False
+
+    def get_tmp_file_path(self) -> str:
+        temp_file_path = self.temp_path
+        temp_folder = os.path.dirname(temp_file_path)
+        return temp_folder
+
+    def _cleanup(self):
+        """清理临时文件"""
+        if hasattr(self, 'temp_file') and not self.temp_file.closed:
+            self.temp_file.close()
+
+        if hasattr(self, 'temp_path') and os.path.exists(self.temp_path):
+            try:
+                os.unlink(self.temp_path)  # 删除临时文件
+                print(f"已删除临时文件: {self.temp_path}")
+            except Exception as e:
+                print(f"删除临时文件失败: {e}")
+
+    def close(self):
+        self._cleanup()
+
+
+class Recorder:
+    """
+    无界面录制: 字节流 -> 帧 -> 6 轴数据行 -> 临时文件
+
+    recorder = Recorder()
+    recorder.feed(chunk)            # 可多次调用
+    recorder.save_as_file(path, info)
+    """
+
+    def __init__(self, resample_hz: Optional[float] = None):
+        self.parser = FrameParser()
+        self.assembler = SampleAssembler()
+        self.file = RecordingFile()
+        self.file.set_resample_rate(resample_hz)
+        self.rows = 0
+
+    def feed(self, chunk: bytes, timestamp_ns: Optional[int] = None) -> int:
+        """处理一块原始数据, 返回写入的行数"""
+        if timestamp_ns is None:
+            timestamp_ns = perf_counter_ns()
+        samples = self.assembler.push_block(self.parser.feed_block(chunk, timestamp_ns))
+        self.file.write_block(samples)
+        self.rows += len(samples)
+        return len(samples)
+
+    def save_as_file(self, path: str, info: DatabaseInfo) -> bool:
+        return self.file.save_as_file(path, info)
+
+    def check_rate(self, info: DatabaseInfo) -> Optional[RateReport]:
+        return self.file.check_rate(info)
+
+    def new_session(self):
+        """开始新的一次录制"""
+        # 字节流是连续的, 解析器缓冲区中不完整的帧保留到下一次录制
+        self.file.re_init()
+        self.assembler.reset()
+        self.rows = 0
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,317 @@
+"""
+多路采集服务：同一路传感器数据流同时分发给多个本地客户端 (录制、在线识别、监视等)
+
+原始字节流 (插件 onReceived 或串口) 只解析一次，解析后的帧按批编码一次，
+再通过 Unix domain socket 推送给所有订阅者。每个订阅者有独立的有界队列，
+客户端处理不过来时按丢弃策略丢批，不会拖慢采集和其他客户端。
+
+消息格式 (小端序)：
+    header  : magic b"HG", uint8 version, uint8 保留, uint32 帧数, uint32 累计丢弃批数
+    records : 帧数 x FRAME_DTYPE (int64 接收时间 ns, uint8 帧类型, float32 x 3)
+
+用法：
+    python stream_server.py /tmp/hgr.sock --source /dev/ttyUSB0 --baud 115200
+    python stream_server.py /tmp/hgr.sock --monitor
+"""
+import argparse
+import asyncio
+import os
+import socket
+import stat
+import struct
+import sys
+import threading
+from time import perf_counter_ns
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from recorder_core import FrameParser, SampleBlock
+
+MAGIC = b"HG"
+PROTOCOL_VERSION = 1
+HEADER = struct.Struct("<2sBxII")
+FRAME_DTYPE = np.dtype([("timestamp", "<i8"), ("type", "u1"), ("values", "<f4", (3,))])
+READ_SIZE = 64 * 1024
+# 连接两端的缓冲上限: 缓冲较大时过期的批会堆积在 socket 缓冲区中,
+# 订阅者的有界队列和丢弃策略就不起作用了
+WRITE_BUFFER_HIGH = 0        # drain() 等到数据全部交给内核后才返回
+SOCKET_BUFFER = 4 * 1024
+READ_BUFFER_LIMIT = 1024
+
+DROP_OLDEST = "oldest"
+DROP_NEWEST = "newest"
+
+
+def encode_frames(frames: SampleBlock) -> bytes:
+    """把帧块编码为 records 部分"""
+    records = np.empty(len(frames), dtype=FRAME_DTYPE)
+    records["timestamp"] = frames.timestamp_array()
+    records["type"] = frames.kind_array()
+    records["values"] = frames.value_array()
+    return records.tobytes()
+
+
+def decode_frames(payload: bytes) -> np.ndarray:
+    return np.frombuffer(payload, dtype=FRAME_DTYPE)
+
+
+def _shrink_socket_buffer(writer: asyncio.StreamWriter, option: int):
+    sock = writer.get_extra_info("socket")
+    if sock is not None:
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, option, SOCKET_BUFFER)
+        except OSError:
+            pass
+
+
+class _Subscriber:
+    __slots__ = ("queue", "dropped", "policy")
+
+    def __init__(self, max_queue: int, policy: str):
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.dropped = 0
+        self.policy = policy
+
+    def offer(self, item: Tuple[int, bytes]):
+        """非阻塞入队, 队列满时按丢弃策略处理"""
+        if self.queue.full():
+            self.dropped += 1
+            if self.policy == DROP_NEWEST:
+                return
+            self.queue.get_nowait()
+        self.queue.put_nowait(item)
+
+
+class AcquisitionServer:
+    """
+    server = AcquisitionServer("/tmp/hgr.sock")
+    server.start_in_thread()                # 插件中使用, 不阻塞 Qt 事件循环
+    server.feed_block_threadsafe(frames)    # 在任意线程中调用, frames 为已解析的帧块
+    """
+
+    def __init__(self, socket_path: str, max_queue: int = 64, drop_policy: str = DROP_OLDEST):
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"未知的丢弃策略: {drop_policy}")
+        self.socket_path = socket_path
+        self.max_queue = max_queue
+        self.drop_policy = drop_policy
+        self.parser = FrameParser()
+        self.frames = 0
+        self._subscribers: Set[_Subscriber] = set()
+        self._handlers: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        if os.path.exists(self.socket_path) and stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._handle_client, self.socket_path)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            # 关闭连接后各客户端协程会自行退出
+            for writer in self._handlers.values():
+                writer.close()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def publish_raw(self, chunk: bytes, timestamp_ns: Optional[int] = None):
+        """解析一块原始数据并分发给所有订阅者, 只能在事件循环线程中调用"""
+        if timestamp_ns is None:
+            timestamp_ns = perf_counter_ns()
+        self.publish_block(self.parser.feed_block(chunk, timestamp_ns))
+
+    def publish_block(self, frames: SampleBlock):
+        """把已解析的帧块分发给所有订阅者, 只能在事件循环线程中调用"""
+        if not len(frames):
+            return
+        self.frames += len(frames)
+        item = (len(frames), encode_frames(frames))
+        for subscriber in self._subscribers:
+            subscriber.offer(item)
+
+    def feed_block_threadsafe(self, frames: SampleBlock):
+        """从其他线程 (如插件接收线程) 投递已解析的帧块, 避免重复解析"""
+        if self._loop is not None and len(frames):
+            self._loop.call_soon_threadsafe(self.publish_block, frames)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscriber = _Subscriber(self.max_queue, self.drop_policy)
+        self._subscribers.add(subscriber)
+        handler = asyncio.current_task()
+        self._handlers[handler] = writer
+        writer.transport.set_write_buffer_limits(high=WRITE_BUFFER_HIGH)
+        _shrink_socket_buffer(writer, socket.SO_SNDBUF)
+        # 客户端只接收数据, 读到 EOF 说明已断开
+        closed = asyncio.ensure_future(reader.read())
+        get = None
+        try:
+            while not closed.done():
+                get = asyncio.ensure_future(subscriber.queue.get())
+                await asyncio.wait((get, closed), return_when=asyncio.FIRST_COMPLETED)
+                if not get.done():
+                    break
+                count, payload = get.result()
+                writer.write(HEADER.pack(MAGIC, PROTOCOL_VERSION, count, subscriber.dropped))
+                writer.write(payload)
+                await writer.drain()
+        except (ConnectionError, BrokenPipeError):
+            pass
+        finally:
+            self._subscribers.discard(subscriber)
+            self._handlers.pop(handler, None)
+            if get is not None:
+                get.cancel()
+            closed.cancel()
+            writer.close()
+
+    async def serve_source(self, path: str, baud: Optional[int] = None):
+        """从串口 / pty / FIFO / 文件读取原始数据直到数据源结束"""
+        from headless_recorder import open_source
+
+        fd = open_source(path, baud)
+        loop = asyncio.get_running_loop()
+        try:
+            if stat.S_ISREG(os.fstat(fd).st_mode):
+                # 普通文件不支持 add_reader, 按块读取并让出事件循环
+                while True:
+                    chunk = os.read(fd, READ_SIZE)
+                    if not chunk:
+                        return
+                    self.publish_raw(chunk)
+                    await asyncio.sleep(0)
+            finished = loop.create_future()
+
+            def on_readable():
+                try:
+                    chunk = os.read(fd, READ_SIZE)
+                except BlockingIOError:
+                    return
+                except OSError:
+                    chunk = b""
+                if chunk:
+                    self.publish_raw(chunk)
+                elif not finished.done():
+                    finished.set_result(None)
+
+            loop.add_reader(fd, on_readable)
+            try:
+                await finished
+            finally:
+                loop.remove_reader(fd)
+        finally:
+            os.close(fd)
+
+    def start_in_thread(self):
+        """在后台线程中运行事件循环, 启动失败时在调用线程中抛出异常"""
+        started = threading.Event()
+        error: List[BaseException] = []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                loop.run_until_complete(self.start())
+            except BaseException as e:
+                error.append(e)
+                self._loop = None
+                loop.close()
+                return
+            finally:
+                started.set()
+            loop.run_forever()
+            loop.run_until_complete(self.stop())
+            loop.close()
+
+        self._thread = threading.Thread(target=run, name="hgr-stream-server", daemon=True)
+        self._thread.start()
+        started.wait()
+        if error:
+            self._thread.join()
+            self._thread = None
+            raise error[0]
+
+    def stop_thread(self):
+        if self._thread is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+
+async def subscribe(socket_path: str) -> AsyncIterator[Tuple[np.ndarray, int]]:
+    """客户端: 连接采集服务, 逐批返回 (帧记录数组, 累计丢弃批数)"""
+    # 接收端同样只缓存少量数据, 处理不过来时由服务端的队列丢批
+    reader, writer = await asyncio.open_unix_connection(socket_path, limit=READ_BUFFER_LIMIT)
+    _shrink_socket_buffer(writer, socket.SO_RCVBUF)
+    try:
+        while True:
+            try:
+                header = await reader.readexactly(HEADER.size)
+            except asyncio.IncompleteReadError:
+                return
+            magic, version, count, dropped = HEADER.unpack(header)
+            if magic != MAGIC or version != PROTOCOL_VERSION:
+                raise ValueError(f"无法识别的数据: {header!r}")
+            payload = await reader.readexactly(count * FRAME_DTYPE.itemsize)
+            yield decode_frames(payload), dropped
+    finally:
+        writer.close()
+
+
+async def _monitor(socket_path: str):
+    frames = 0
+    last_report = perf_counter_ns()
+    async for records, dropped in subscribe(socket_path):
+        frames += len(records)
+        now = perf_counter_ns()
+        if now - last_report >= 1_000_000_000:
+            rate = frames * 1e9 / (now - last_report)
+            print(f"{rate:8.1f} 帧/秒  丢弃 {dropped} 批")
+            frames = 0
+            last_report = now
+
+
+async def _serve(args):
+    server = AcquisitionServer(args.socket, args.max_queue, args.drop)
+    await server.start()
+    print(f"采集服务已启动: {args.socket}")
+    try:
+        if args.source:
+            await server.serve_source(args.source, args.baud)
+        else:
+            await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多路采集服务")
+    parser.add_argument("socket", help="Unix domain socket 路径")
+    parser.add_argument("--source", default=None, help="串口设备、pty 或文件/FIFO 路径")
+    parser.add_argument("--baud", type=int, default=None, help="串口波特率")
+    parser.add_argument("--max-queue", type=int, default=64, help="每个客户端最多缓存的批数")
+    parser.add_argument("--drop", choices=(DROP_OLDEST, DROP_NEWEST), default=DROP_OLDEST,
+                        help="客户端队列满时丢弃最旧或最新的批")
+    parser.add_argument("--monitor", action="store_true", help="作为客户端连接并显示帧率")
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(_monitor(args.socket) if args.monitor else _serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
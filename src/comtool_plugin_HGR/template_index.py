@@ -0,0 +1,327 @@
+"""
+手势模板相似度索引：DTW k 近邻查询 + 同组重复采集的离群检测
+
+每条录制先重采样到固定长度并逐通道 z-score 归一化 (包络)，查询时先用
+LB_Keogh 下界批量排除候选，只对剩下的候选计算带 Sakoe-Chiba 约束的 DTW。
+新保存的录制可以增量插入。
+
+用法：
+    python template_index.py <CSV 目录>      # 检查目录中每条录制是否离群
+"""
+import argparse
+import sys
+import threading
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from data_loader import CHANNELS, find_recordings, load_directory, load_recordings
+from record_format import DatabaseInfo
+
+
+def resample_length(values: np.ndarray, length: int) -> np.ndarray:
+    """按样本序号线性插值到固定长度"""
+    values = np.asarray(values, dtype=np.float32)
+    if len(values) == length:
+        return values
+    if len(values) == 0:
+        return np.zeros((length, values.shape[1] if values.ndim == 2 else CHANNELS), dtype=np.float32)
+    position = np.linspace(0, len(values) - 1, length)
+    left = np.floor(position).astype(np.int64)
+    right = np.minimum(left + 1, len(values) - 1)
+    weight = (position - left)[:, None].astype(np.float32)
+    return values[left] * (1 - weight) + values[right] * weight
+
+
+def z_normalize(values: np.ndarray) -> np.ndarray:
+    """逐通道 z-score 归一化"""
+    std = values.std(axis=0)
+    std[std < 1e-6] = 1.0
+    return (values - values.mean(axis=0)) / std
+
+
+def make_envelope(values: np.ndarray, length: int) -> np.ndarray:
+    return z_normalize(resample_length(values, length)).astype(np.float32)
+
+
+def keogh_bounds(series: np.ndarray, radius: int) -> Tuple[np.ndarray, np.ndarray]:
+    """LB_Keogh 上下包络: 每个点前后 radius 范围内的最大/最小值"""
+    padded = np.pad(series, ((radius, radius), (0, 0)), mode="edge")
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * radius + 1, axis=0)
+    return windows.max(axis=-1), windows.min(axis=-1)
+
+
+def lb_keogh(query: np.ndarray, upper: np.ndarray, lower: np.ndarray) -> np.ndarray:
+    """
+    query 与多个候选的 LB_Keogh 下界
+
+    Args:
+        query (np.ndarray): [length, channels]
+        upper, lower (np.ndarray): 候选的上下包络, [n, length, channels]
+    """
+    above = np.maximum(query - upper, 0)
+    below = np.maximum(lower - query, 0)
+    return np.sqrt((above * above + below * below).sum(axis=(1, 2)))
+
+
+def dtw_distances(query: np.ndarray, candidates: np.ndarray, radius: Optional[int] = None) -> np.ndarray:
+    """
+    query 与每个候选的 DTW 距离 (代价为各通道差的平方和), 在候选维度上向量化
+
+    Args:
+        query (np.ndarray): [length, channels]
+        candidates (np.ndarray): [n, length, channels]
+        radius (int): Sakoe-Chiba 带宽, None 表示不限制
+    """
+    n, length, _ = candidates.shape
+    if radius is None:
+        radius = length
+    acc = np.full((n, length + 1), np.inf)
+    acc[:, 0] = 0.0
+    for i in range(length):
+        lo = max(0, i - radius)
+        hi = min(length, i + radius + 1)
+        # 带内的代价: query 第 i 个点与候选第 lo..hi-1 个点
+        cost = ((candidates[:, lo:hi, :] - query[i]) ** 2).sum(axis=-1)
+        prev = acc
+        acc = np.full((n, length + 1), np.inf)
+        for j in range(lo + 1, hi + 1):
+            best = np.minimum(np.minimum(prev[:, j], prev[:, j - 1]), acc[:, j - 1])
+            acc[:, j] = cost[:, j - 1 - lo] + best
+    return np.sqrt(acc[:, length])
+
+
+class OutlierReport(NamedTuple):
+    distance: float     # 与同组最近邻的 DTW 距离
+    threshold: float    # 判定阈值, 同组样本不足时为 inf
+    group_size: int
+    outlier: bool
+
+    def describe(self) -> str:
+        if self.outlier:
+            return f"本次采集与之前差异较大: 距离 {self.distance:.2f} > {self.threshold:.2f}"
+        return f"本次采集正常: 距离 {self.distance:.2f}"
+
+
+class TemplateIndex:
+    """
+    index = TemplateIndex()
+    index.add(values, info)
+    index.query(values, k=3)                 # -> [(distance, position), ...]
+    index.check_outlier(values, info)        # 与同一 gesture_type / participant_id 的录制比较
+    """
+
+    def __init__(self, length: int = 32, radius: int = 3, batch_size: int = 16):
+        self.length = length
+        self.radius = radius
+        self.batch_size = batch_size
+        self.infos: List[DatabaseInfo] = []
+        self.keys: List[Optional[str]] = []
+        self.raw_lengths: List[int] = []
+        self._envelopes = np.empty((0, length, CHANNELS), dtype=np.float32)
+        self._upper = np.empty_like(self._envelopes)
+        self._lower = np.empty_like(self._envelopes)
+        self._nn_distances = np.empty(0, dtype=np.float64)
+        self._groups = np.empty(0, dtype=object)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    @staticmethod
+    def group_of(info: DatabaseInfo) -> str:
+        return f"{info.gesture_type}/{info.participant_id}"
+
+    @classmethod
+    def from_directory(cls, path: str, workers: Optional[int] = None, **kwargs) -> "TemplateIndex":
+        """
+        用目录下的录制文件构建索引
+
+        workers 为读取文件的进程数 (见 data_loader.load_recordings);
+        在插件中调用时传 1, 不在 GUI 进程中启动进程池。
+        """
+        tasks = find_recordings(path)
+        index = cls(**kwargs)
+        recordings = load_recordings([file for _, file in tasks], workers)
+        index.add_many([(rec.values, rec.info, key)
+                        for (key, _), rec in zip(tasks, recordings) if len(rec.values) > 1])
+        return index
+
+    def _grow(self, capacity: int):
+        """按倍数扩容, 已有的数组视图在扩容后仍然有效"""
+        def grown(array):
+            new = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+            new[:self._size] = array[:self._size]
+            return new
+        self._envelopes = grown(self._envelopes)
+        self._upper = grown(self._upper)
+        self._lower = grown(self._lower)
+        self._nn_distances = grown(self._nn_distances)
+        self._groups = grown(self._groups)
+
+    def add_many(self, items: Sequence[Tuple[np.ndarray, DatabaseInfo, Optional[str]]],
+                 sample: int = 64):
+        """
+        批量插入 (values, info, key), 用于从已有录制构建索引
+
+        逐条 add 时每条都要与同组之前的录制做一次 DTW 查询, 同组录制很多时
+        接近 O(n^2)。这里先一次写入全部包络, 再在每组中均匀抽取最多 sample 条,
+        计算其与同组其他录制的最近邻距离, 作为离群阈值的统计样本。
+        """
+        if not items:
+            return
+        envelopes = np.stack([make_envelope(values, self.length) for values, _, _ in items])
+        bounds = [keogh_bounds(envelope, self.radius) for envelope in envelopes]
+        groups = np.array([self.group_of(info) for _, info, _ in items], dtype=object)
+        with self._lock:
+            start = self._size
+            end = start + len(items)
+            if end > len(self._envelopes):
+                capacity = max(16, len(self._envelopes))
+                while capacity < end:
+                    capacity *= 2
+                self._grow(capacity)
+            self._envelopes[start:end] = envelopes
+            self._upper[start:end] = [upper for upper, _ in bounds]
+            self._lower[start:end] = [lower for _, lower in bounds]
+            self._nn_distances[start:end] = np.nan
+            self._groups[start:end] = groups
+            self.infos.extend(info for _, info, _ in items)
+            self.keys.extend(key for _, _, key in items)
+            self.raw_lengths.extend(len(values) for values, _, _ in items)
+            self._size = end
+
+        distances = {}
+        for group in set(groups.tolist()):
+            members = start + np.flatnonzero(groups == group)
+            if members.size < 2:
+                continue
+            chosen = np.unique(np.linspace(0, members.size - 1, min(sample, members.size)).astype(np.int64))
+            for pos in members[chosen].tolist():
+                nearest = self.query(None, k=2, group=group, envelope=self._envelopes[pos])
+                others = [distance for distance, other in nearest if other != pos]
+                if others:
+                    distances[pos] = others[0]
+        with self._lock:
+            for pos, distance in distances.items():
+                self._nn_distances[pos] = distance
+
+    def add(self, values: np.ndarray, info: DatabaseInfo, key: Optional[str] = None,
+            envelope: Optional[np.ndarray] = None,
+            nearest: Optional[List[Tuple[float, int]]] = None) -> int:
+        """插入一条录制, 返回其位置; 已查询过同组最近邻时可通过 nearest 传入"""
+        if envelope is None:
+            envelope = make_envelope(values, self.length)
+        upper, lower = keogh_bounds(envelope, self.radius)
+        group = self.group_of(info)
+        if nearest is None:
+            nearest = self.query(values, k=1, group=group, envelope=envelope)
+        with self._lock:
+            pos = self._size
+            if pos >= len(self._envelopes):
+                self._grow(max(16, 2 * len(self._envelopes)))
+            self._envelopes[pos] = envelope
+            self._upper[pos] = upper
+            self._lower[pos] = lower
+            self._nn_distances[pos] = nearest[0][0] if nearest else np.nan
+            self._groups[pos] = group
+            self.infos.append(info)
+            self.keys.append(key)
+            self.raw_lengths.append(len(values))
+            self._size = pos + 1
+        return pos
+
+    def query(self, values: np.ndarray, k: int = 1, group: Optional[str] = None,
+              envelope: Optional[np.ndarray] = None) -> List[Tuple[float, int]]:
+        """返回 k 个最近邻 (DTW 距离, 位置), 按距离升序"""
+        if envelope is None:
+            envelope = make_envelope(values, self.length)
+        with self._lock:
+            size = self._size
+            envelopes = self._envelopes[:size]
+            upper = self._upper[:size]
+            lower = self._lower[:size]
+            groups = self._groups[:size]
+
+        candidates = np.arange(size)
+        if group is not None:
+            candidates = candidates[groups == group]
+        if candidates.size == 0:
+            return []
+
+        bounds = lb_keogh(envelope, upper[candidates], lower[candidates])
+        order = np.argsort(bounds)
+        # DTW 的开销主要在逐行循环上, 与候选数关系不大: 先算下界最小的一批
+        # 得到第 k 个距离, 再一次性计算下界仍小于它的全部候选
+        seed = order[:max(k, self.batch_size)]
+        distances = dtw_distances(envelope, envelopes[candidates[seed]], self.radius)
+        best = sorted(zip(distances.tolist(), candidates[seed].tolist()))[:k]
+        rest = order[seed.size:]
+        if rest.size:
+            if len(best) >= k:
+                rest = rest[bounds[rest] < best[-1][0]]
+            if rest.size:
+                distances = dtw_distances(envelope, envelopes[candidates[rest]], self.radius)
+                best = sorted(best + list(zip(distances.tolist(), candidates[rest].tolist())))[:k]
+        return best
+
+    def check_outlier(self, values: np.ndarray, info: DatabaseInfo,
+                      threshold: float = 3.0, min_group_size: int = 3) -> OutlierReport:
+        """
+        与同组已有录制比较是否离群
+
+        同组每条录制在插入时记录了与之前录制的最近邻距离，
+        新录制的最近邻距离超过 median + threshold * MAD 视为离群。
+        """
+        group = self.group_of(info)
+        return self._judge(self.query(values, k=1, group=group), group, threshold, min_group_size)
+
+    def _judge(self, nearest: List[Tuple[float, int]], group: str,
+               threshold: float, min_group_size: int) -> OutlierReport:
+        if not nearest:
+            return OutlierReport(float("nan"), float("inf"), 0, False)
+        distance = nearest[0][0]
+        with self._lock:
+            size = self._size
+            mask = self._groups[:size] == group
+            history = self._nn_distances[:size][mask]
+        group_size = int(mask.sum())
+        history = history[~np.isnan(history)]
+        if history.size < min_group_size - 1:
+            return OutlierReport(distance, float("inf"), group_size, False)
+        median = float(np.median(history))
+        mad = float(np.median(np.abs(history - median))) or 0.1 * median
+        limit = median + threshold * 1.4826 * mad
+        return OutlierReport(distance, limit, group_size, distance > limit)
+
+    def check_and_add(self, values: np.ndarray, info: DatabaseInfo, key: Optional[str] = None,
+                      threshold: float = 3.0, min_group_size: int = 3) -> OutlierReport:
+        """采集完成后调用: 先检查是否离群, 再插入索引 (同组最近邻只查询一次)"""
+        envelope = make_envelope(values, self.length)
+        group = self.group_of(info)
+        nearest = self.query(values, k=1, group=group, envelope=envelope)
+        report = self._judge(nearest, group, threshold, min_group_size)
+        self.add(values, info, key, envelope=envelope, nearest=nearest)
+        return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="检查录制文件中的离群重复采集")
+    parser.add_argument("src", help="CSV 录制文件所在目录")
+    parser.add_argument("--threshold", type=float, default=3.0, help="离群阈值 (MAD 倍数)")
+    args = parser.parse_args(argv)
+
+    index = TemplateIndex()
+    for key, rec in load_directory(args.src):
+        if len(rec.values) <= 1:
+            continue
+        report = index.check_and_add(rec.values, rec.info, key, args.threshold)
+        if report.outlier:
+            print(f"{key}: {report.describe()}")
+    print(f"已检查 {len(index)} 条录制")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())